@@ -7,8 +7,10 @@ import os
 from datetime import datetime, timedelta
 import gzip
 import re 
+import json
+import warnings
 
-from utils.constants import IMS_DIR, EMPTY_PATH
+from utils.constants import IMS_DIR, EMPTY_PATH, PERSIST_CATALOG
 #EMPTY_PATH is to a zipped txt file created by saving a 1024x1024 array of zeros to file
 
 #missing days come from G02156_missing_files.txt provided with IMS data
@@ -36,6 +38,15 @@ unpacked = {'1997': [[38, 45], [47, 137], [139, 154], [156, 160],
             '2012': [], '2013': [], '2014': [], '2015': [], '2016': [],
             '2017': [], '2018': [], '2019': [], '2020': []} 
 
+#grid squares outside of [158:867, 158:867] have masked lat/lon values, this is the valid domain
+DOMAIN_OFFSET = 158
+DOMAIN_SLICE = slice(DOMAIN_OFFSET, 1024-DOMAIN_OFFSET+1)
+
+#lookup table from unpacked values (0-255) to packed categories
+UNPACKED_LUT = np.arange(256, dtype=np.uint8)
+UNPACKED_LUT[164] = 3 #sea ice
+UNPACKED_LUT[165] = 4 #snow covered land
+
 def year_len(year):
    if year % 4 == 0:
       return 366
@@ -51,6 +62,31 @@ def list_unpacked_days(year):
    print('Unpacked days in '+str(year)+':', days)
    return days
 
+def snow_year_slice(year_min, year_max):
+   '''
+   Returns the time slice from August 1 of year_min to the end of July 31 of year_max,
+   for selecting snow years with xarray's sel.
+   '''
+   return slice(str(year_min)+'-08-01', str(year_max)+'-07-31')
+
+def crop_to_domain(data):
+   '''
+   Returns data cut to the valid domain (DOMAIN_SLICE) on its yc and xc axes.
+   Data that is already cut, e.g. read from files written with CROP_DOMAIN,
+   is returned as is.
+
+   Args:
+      data: numpy array with yc, xc as its last two axes, or xarray object with
+         yc, xc dimensions.
+   '''
+   if hasattr(data, 'dims'):
+      if data.sizes['xc'] != 1024:
+         return data
+      return data.isel(yc=DOMAIN_SLICE, xc=DOMAIN_SLICE)
+   if np.shape(data)[-1] != 1024:
+      return data
+   return data[..., DOMAIN_SLICE, DOMAIN_SLICE]
+
 def load_latlon():
    '''
    Loads auxiliary coordinate data from IMS dataset into 2D arrays (latitude
@@ -71,10 +107,138 @@ def load_latlon():
 
    return lat_data, lon_data
 
+#raw file names, e.g. ims1998001_24km_v1.2.asc.gz
+IMS_FNAME = re.compile(r'ims(\d{4})(\d{3})_24km_(v[\d.]+)\.asc\.gz$')
+
+_listings = {} #year -> {day of year: [(file name, version), ...]}, filled by list_year_files
+_catalogs = {} #year -> catalog, filled by build_catalog
+
+def list_year_files(year, persist=PERSIST_CATALOG):
+   '''
+   Indexes the raw IMS files in IMS_DIR/year/ by day of year, with a single
+   directory listing per year per process.
+
+   Args:
+      year (int): year of interest.
+      persist (bool): if True, keep the listing in a sidecar file IMS_DIR/catalog_YYYY.json
+         and reuse it while the year directory is unchanged (same mtime), so no
+         directory listing is needed at all.
+
+   Returns:
+      dict mapping day of year (int) to a list of (file name, version) tuples.
+   '''
+   if year in _listings:
+      return _listings[year]
+
+   year_dir = IMS_DIR+str(year)+'/'
+   if not os.path.isdir(year_dir):
+      _listings[year] = {}
+      return _listings[year]
+
+   mtime = os.stat(year_dir).st_mtime
+   sidecar = IMS_DIR+'catalog_'+str(year)+'.json'
+   fnames = None
+   if persist and os.path.exists(sidecar):
+      with open(sidecar, 'r') as f:
+         saved = json.load(f)
+      if saved['mtime'] == mtime:
+         fnames = saved['files']
+   if fnames is None:
+      fnames = sorted(os.listdir(year_dir))
+      if persist:
+         with open(sidecar, 'w') as f:
+            json.dump({'mtime': mtime, 'files': fnames}, f)
+
+   listing = index_files(fnames)
+
+   _listings[year] = listing
+   return listing
+
+def index_files(fnames):
+   '''
+   Returns a dict mapping day of year (int) to a list of (file name, version) tuples,
+   given the names of the raw IMS files of one year. Other names are ignored.
+   '''
+   listing = {}
+   for fn in fnames:
+      match = IMS_FNAME.match(fn)
+      if match is not None:
+         listing.setdefault(int(match.group(2)), []).append((fn, match.group(3)))
+   return listing
+
+def build_catalog(year, persist=PERSIST_CATALOG, refresh=False):
+   '''
+   Resolves every day of year to the IMS file holding its data, see file_and_date
+   for the naming rules. Built once per year per process.
+
+   Args:
+      year (int): year of interest.
+      persist (bool): passed to list_year_files.
+      refresh (bool): if True, list the year directories again, e.g. after new files were downloaded.
+
+   Returns:
+      dict mapping day of year (int, counting from 1) to a tuple 
+      (path, version, packed, date). Missing days have path EMPTY_PATH and version None.
+   '''
+   if refresh:
+      for y in [year, year+1]:
+         _listings.pop(y, None)
+      _catalogs.pop(year, None)
+
+   if year in _catalogs:
+      return _catalogs[year]
+
+   catalog = catalog_from_listings(year, list_year_files(year, persist), list_year_files(year+1, persist))
+
+   _catalogs[year] = catalog
+   return catalog
+
+def catalog_from_listings(year, this_year, next_year):
+   '''
+   Returns the catalog of year (see build_catalog) given the raw IMS files of year 
+   and year+1, indexed as by index_files. Paths are given in IMS_DIR even if the 
+   files are not there, e.g. when the listings come from the FTP server.
+   '''
+   unpacked_days = set(int(d) for d in list_unpacked_days(year))
+
+   catalog = {}
+   for true_dayofyear in range(1, year_len(year)+1):
+      date = datetime(year, 1, 1)+timedelta(true_dayofyear-1)
+      nextday = date+timedelta(1)
+      next_doy = int(nextday.strftime('%j'))
+      next_files = this_year if nextday.year == year else next_year
+
+      packed = true_dayofyear not in unpacked_days
+
+      #v1.3 files are named using the next day's day of year - does one exist?
+      next_1_3 = [fn for fn, version in next_files.get(next_doy, []) if version == 'v1.3']
+      if (next_doy not in missing.get(str(nextday.year), [])) and next_1_3:
+         #yes, so this is the right path for the date given
+         catalog[true_dayofyear] = (IMS_DIR+str(nextday.year)+'/'+next_1_3[0], 'v1.3', packed, date)
+         continue
+
+      #no, so try looking for a file that is NOT v1.3 with the true day of year
+      files = this_year.get(true_dayofyear, [])
+      v1_3_exists = any(version == 'v1.3' for fn, version in files)
+      if (true_dayofyear not in missing[str(year)]) and not v1_3_exists and files:
+         fn, version = files[0]
+         catalog[true_dayofyear] = (IMS_DIR+str(year)+'/'+fn, version, packed, date)
+      else:
+         #the file does not exist for this day
+         catalog[true_dayofyear] = (EMPTY_PATH, None, packed, date)
+
+   return catalog
+
 def file_and_date(true_dayofyear, year):
    '''
    Returns appropriate IMS file path and the correct date associated with inputs.
 
+   v1.3 files are named one day off: the file named with the next day's day of 
+   year holds the data for true_dayofyear. Otherwise the file named with 
+   true_dayofyear is used, unless the day is listed in 'missing' or its name is 
+   taken by a v1.3 file (belonging to the day before), in which case EMPTY_PATH 
+   is returned. Lookups go through the per-year catalog (build_catalog).
+
    Args:
       true_dayofyear (int): The day of the year of interest, counting from 1 on January 1, XXXX.
       year (int): The year of interest.
@@ -83,51 +247,38 @@ def file_and_date(true_dayofyear, year):
       pathname for the file associated with true_dayofyear of year, taking into 
       account IMS dataset naming conventions.
    '''
-   
-   date = datetime(year, 1, 1)+timedelta(true_dayofyear-1)
-   nextday = date+timedelta(1)
-   
-   #define v1.3 path using the next day's day of year - does it exist?
-   path_next_1_3 = IMS_DIR+str(nextday.year)+'/'+'ims'+str(nextday.year)+str(nextday.strftime('%j'))+'_24km_v1.3.asc.gz'
-   nextday_not_missing = np.isin(int(nextday.strftime('%j')), missing[str(nextday.year)], invert=True)
-   if nextday_not_missing and os.path.exists(path_next_1_3):
-      #yes, so this is the right path for the date given
-      return path_next_1_3, date
-   else:
-      #no, so try looking for a file that is NOT v1.3 with the true day of year - does it exist?
-      path_1_3 = IMS_DIR+str(year)+'/'+'ims'+str(year)+str('%03d' % true_dayofyear)+'_24km_v1.3.asc.gz'
-      day_not_missing = np.isin(true_dayofyear, missing[str(year)], invert=True)
-      v1_3_not_exist = not os.path.exists(path_1_3)
-      if day_not_missing and v1_3_not_exist:
-         #yes, so return the path to this file
-         true_path = [IMS_DIR+str(year)+'/'+fn for fn in os.listdir(IMS_DIR+str(year)+'/') if str('%03d' % true_dayofyear)+'_' in fn][0]
-         return true_path, date
-      else:
-         #no, so the file does not exist for this day, return empty array
-         return EMPTY_PATH, date
+
+   path, version, packed, date = build_catalog(year)[true_dayofyear]
+   return path, date
 
 def read_packed(fname):
    '''
    Reads IMS file that has been packaged in packed form to numpy array.
 
+   Data rows are the lines starting with '00', one character per grid square,
+   so the rows are joined into one byte buffer and decoded in a single pass by
+   subtracting ord('0').
+
    Args:
       fname (str): full path to file in question.
     
    Returns:
-      data (array): IMS data for day of year associated with this file.
-   '''
-   with gzip.open(fname, 'rt') as f:
-      file_content = f.read().splitlines()
-      data = np.zeros((1024,1024))
-      counter = 0
-      for line_num in range(len(file_content)):
-         line = file_content[line_num]
-         if line.startswith('00'):
-            data[counter, :] = [i for i in line]
-            counter += 1           
-         else: 
-            continue
-      return data
+      data (array): IMS data (uint8) for day of year associated with this file.
+   '''
+   with gzip.open(fname, 'rb') as f:
+      return decode_packed(f.read())
+
+def decode_packed(content):
+   '''
+   Decodes the content (uncompressed bytes) of an IMS file in packed form, see read_packed.
+   '''
+   rows = [line for line in content.splitlines() if line.startswith(b'00')]
+
+   data = np.zeros((1024,1024), dtype=np.uint8)
+   if len(rows) > 0: #EMPTY_PATH file has no data rows, leave it as zeros
+      buffer = np.frombuffer(b''.join(rows), dtype=np.uint8)
+      data[:len(rows), :] = np.reshape(buffer, (len(rows), 1024)) - ord('0')
+   return data
          
 def read_unpacked(fname):
    '''
@@ -137,28 +288,40 @@ def read_unpacked(fname):
       fname (str): full path to file in question.
     
    Returns:
-      data (array): IMS data for day of year associated with this file.
+      data (array): IMS data (uint8) for day of year associated with this file.
    '''
 
-   with gzip.open(fname, 'rt') as f:
-      if("empty_file" in fname):
-         DataArray = np.zeros((1024,1024))
-      else:
-         # Skip 1200 bytes within the header.
-         f.seek(1280)
-         # Take all lines after the header, strip the end-line character and join all in one string.
-         Lines = " ".join(line.strip('\n') for line in f)
-         # Remove all white space from Lines with Lines.split.
-         # If characters (s) in string are digits, convert to integers, then convert to a NumPy Array.
-         # Lastly, reshape to 1024 x 1024 24 km resolution.
-         DataArray = np.reshape(np.asarray([int(s) for s in Lines.split() if s.isdigit()]), [1024,1024])
-
-         # From the documentation (Table 3):
-         # For unpacked data, integer value of 164 is sea ice, while 165 is snow-covered land.
-         # Convert 164 to 3 (sea ice) and 165 to 4 (snow covered land) to align with packed data.
-         DataArray = np.where(DataArray == 164, 3, DataArray)
-         DataArray = np.where(DataArray == 165, 4, DataArray)
-      return DataArray
+   if("empty_file" in fname):
+      return np.zeros((1024,1024), dtype=np.uint8)
+
+   with gzip.open(fname, 'rb') as f:
+      # Skip 1280 bytes within the header.
+      f.seek(1280)
+      return decode_unpacked(f.read())
+
+def decode_unpacked(content):
+   '''
+   Decodes the content (uncompressed bytes, after the first 1280 bytes of header) of 
+   an IMS file in unpacked form, see read_unpacked.
+   '''
+
+   # Parse the whitespace-separated integers in one call. If a non-digit token
+   # stops the parse early, fall back to keeping only the tokens that are digits.
+   try:
+      with warnings.catch_warnings():
+         warnings.simplefilter('ignore', DeprecationWarning)
+         values = np.fromstring(content, dtype=np.int64, sep=' ')
+   except ValueError:
+      values = None
+   if values is None or values.size != 1024*1024:
+      tokens = np.array(content.split())
+      values = tokens[np.char.isdigit(tokens)].astype(np.int64)
+
+   # Reshape to 1024 x 1024 24 km resolution.
+   values = np.reshape(values, (1024,1024))
+
+   # From the documentation (Table 3):
+   # For unpacked data, integer value of 164 is sea ice, while 165 is snow-covered land.
+   # Convert 164 to 3 (sea ice) and 165 to 4 (snow covered land) to align with packed data.
+   return UNPACKED_LUT[values]
 
-         
-   
@@ -0,0 +1,248 @@
+## Created: Oct 18, 2026
+## Last edited: Oct 18, 2026
+
+import xarray as xr 
+import dask
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.constants import IMS_files_loc, SNOW_BITS, CACHE_SCD, BATCH_WORKERS
+from utils.snow_bits import seasonal_SCD_from_bits
+from utils.snow_dates import snow_year_dates, DATE_VARIABLES
+from utils.snow_products import snow_year_products, PRODUCTS
+from utils.IMS_tools import crop_to_domain, snow_year_slice
+from utils.SCD_cache import cached_snow_year, clim_state, clim_from_state, standardized_anomaly
+
+#the SCD calculations of SCD_anomaly_calc.py, kept out of the script so worker processes can import them
+
+plot_root = Path(__file__).absolute().parent.parent
+data_root = plot_root.parent / 'data' #output files are saved here
+
+def load_years(year_min, year_max):
+   '''
+   Returns IMS snow cover data from (August, year_min)-(July, year_max)
+
+   Args:
+      year_min (int): loaded data will be after August of this year. Must be 1998 or later for this dataset.
+      year_max (int): loaded data will be before July of this year. 
+
+   Returns: 
+      xarray Dataset containing daily snow cover data. 
+   '''
+
+   years = [IMS_files_loc+'IMS_snowc_'+str(year)+'.nc' for year in range(year_min, year_max + 1)]
+
+   #only variables with a time dimension are concatenated, lat/lon are taken from the first file
+   data = xr.open_mfdataset(years, combine='by_coords', data_vars='minimal', coords='minimal', compat='override')
+
+   #time is sorted, so the snow years are one contiguous slice and no other months are read
+   data = data.sel(time=snow_year_slice(year_min, year_max))
+
+   return data
+
+def calc_seasonal_SCD(data):
+   '''
+   Returns SCD (count of snow-covered days) per season in variable snowc, and the 
+   count of days with IMS data in variable valid_days, so that days with no data 
+   (NaN in snowc) are not mistaken for days with no snow.
+   '''
+
+   data = data.assign(valid_days=data.snowc) #count() below ignores NaN, i.e. days with no data
+   data['snowc'] = data.snowc.where(data.snowc == 4)
+   data = data.resample(time='6MS', loffset='3M').count() 
+   data = data.groupby('time.season').mean() #autumn snowfall is labelled by season = 'SON', spring SCD by 'MAM'
+
+   return data
+
+def snow_year_SCD(year):
+   '''
+   Returns seasonal SCD for the snow year (August, year)-(July, year+1), see calc_seasonal_SCD. 
+   Uses the packed snow masks if SNOW_BITS is set in utils/constants.py.
+   '''
+   if SNOW_BITS:
+      return seasonal_SCD_from_bits(year, year+1)
+   return calc_seasonal_SCD(load_years(year, year+1))
+
+def seasonal_SCD(year_min, year_max):
+   '''
+   Returns seasonal SCD for (August, year_min)-(July, year_max), averaged over the snow years. 
+   If CACHE_SCD is set in utils/constants.py, the SCD of each snow year is computed once and 
+   saved (see utils/SCD_cache.py), so only snow years whose IMS files changed are recomputed.
+   '''
+   if CACHE_SCD:
+      years = [cached_snow_year(year, snow_year_SCD) for year in range(year_min, year_max)]
+      return xr.concat(years, dim='snow_year').mean('snow_year')
+   if SNOW_BITS:
+      return seasonal_SCD_from_bits(year_min, year_max)
+   return calc_seasonal_SCD(load_years(year_min, year_max))
+
+def clim_SCD(year_min, year_max):
+   '''
+   Returns climatological seasonal SCD for (August, year_min)-(July, year_max). If CACHE_SCD 
+   is set, it comes from the saved climatology accumulator (see utils/SCD_cache.py), which 
+   also gives the standard deviation across snow years in variable snowc_std.
+   '''
+   if CACHE_SCD:
+      return clim_from_state(clim_state(year_min, year_max, snow_year_SCD))
+   return seasonal_SCD(year_min, year_max)
+
+def clim_to_netcdf(clim_year_min, clim_year_max):
+   '''
+   Calculates climatologial SCD for two seasons and writes to NetCDF.
+
+   Args: 
+      clim_year_min (int): data after August of clim_year_min will be used to calculate the climatology
+      clim_year_max (int): data up to July of clim_year_max will be used to calculate the climatology
+
+   Returns:
+      xarray Dataset with the climatology, to be reused by anom_to_netcdf.
+   '''
+
+   clim_data = clim_SCD(clim_year_min, clim_year_max).load()
+
+   variables = [var for var in ['snowc', 'snowc_std', 'valid_days'] if var in clim_data]
+   cut_data = crop_to_domain(clim_data[variables])
+   file_name = 'clim_SCD_'+str(clim_year_min)+'_'+str(clim_year_max)+'_using_'+str(clim_year_min)+'_'+str(clim_year_max)+'.nc'
+   cut_data.to_netcdf(data_root / file_name)
+   return clim_data
+
+   
+def anom_to_netcdf(year, clim_year_min, clim_year_max, clim=None):
+   ''' 
+   Saves xarray Dataarray as netcdf containing count of days with snow cover in "year" of interest. 
+
+   Args:
+      year (tuple of int): year of interest, e.g. [2017, 2018] for Aug 2017-July 2018 snow season.
+      clim_year_min (int): data after August of clim_year_min will be used to calculate the climatology
+      clim_year_max (int): data up to July of clim_year_max will be used to calculate the climatology
+      clim (xarray Dataset): climatology already calculated for this period (see clim_to_netcdf), calculated here if None
+   '''
+   clim_seasonal_SCD = clim if clim is not None else clim_SCD(clim_year_min, clim_year_max)
+   current_SCD = seasonal_SCD(year[0], year[1])
+
+   anom = current_SCD.snowc - clim_seasonal_SCD.snowc
+   anom = anom.to_dataset().assign(valid_days=current_SCD.valid_days) #valid_days is for the year of interest
+   if 'snowc_std' in clim_seasonal_SCD:
+      anom['snowc_std_anom'] = standardized_anomaly(current_SCD, clim_seasonal_SCD)
+   #cut out area that does not have masked lat/lon values
+
+   cut_data = crop_to_domain(anom)
+   file_name = 'anom_SCD_'+str(year[0])+'_to_'+str(year[1])+'.nc'
+   file_name = 'anom_SCD_'+str(year[0])+'_'+str(year[1])+'_using_'+str(clim_year_min)+'_to_'+str(clim_year_max)+'.nc'
+   cut_data.to_netcdf(data_root / file_name)
+
+def init_batch(clim, clim_year_min, clim_year_max):
+   '''
+   Keeps the climatology and its period in each worker process of batch_anom_to_netcdf, so they are sent once per worker.
+   Only run in the worker processes, as it sets the dask scheduler of the whole process.
+   '''
+   global batch_clim
+   batch_clim = (clim, clim_year_min, clim_year_max)
+   dask.config.set(scheduler='synchronous') #dask's thread pool does not survive the fork, and each process is already one task at a time
+
+def batch_anom(year):
+   clim, clim_year_min, clim_year_max = batch_clim
+   anom_to_netcdf([year, year+1], clim_year_min, clim_year_max, clim)
+   return year
+
+def batch_anom_to_netcdf(years, clim_year_min, clim_year_max, clim, workers=BATCH_WORKERS):
+   '''
+   Saves SCD anomaly files (see anom_to_netcdf) for several snow years against one climatology.
+
+   Args:
+      years (list of int): first year of each snow year, e.g. 2017 for Aug 2017-July 2018.
+      clim_year_min (int): data after August of clim_year_min was used to calculate the climatology
+      clim_year_max (int): data up to July of clim_year_max was used to calculate the climatology
+      clim (xarray Dataset): climatology, see clim_to_netcdf.
+      workers (int): number of worker processes, 1 does one year at a time.
+   '''
+   if workers > 1:
+      with ProcessPoolExecutor(max_workers=workers, initializer=init_batch, initargs=(clim, clim_year_min, clim_year_max)) as pool:
+         for year in pool.map(batch_anom, years):
+            print('done SCD anomaly for snow year '+str(year)+'-'+str(year+1))
+   else: #in this process, so dask keeps its thread pool
+      for year in years:
+         anom_to_netcdf([year, year+1], clim_year_min, clim_year_max, clim)
+         print('done SCD anomaly for snow year '+str(year)+'-'+str(year+1))
+
+def snow_dates_to_netcdf(year, clim_year_min, clim_year_max, clim=None):
+   '''
+   Saves NetCDF file with first snow day, snow-off day and longest run of snow days
+   in "year" of interest and their anomalies relative to the climatological period.
+   The snow years are computed one at a time from the yearly files, ROW_BLOCK rows 
+   at a time, see utils/snow_dates.py.
+
+   Args:
+      year (tuple of int): year of interest, e.g. [2017, 2018] for Aug 2017-July 2018 snow season.
+      clim_year_min (int): data after August of clim_year_min will be used to calculate the climatology
+      clim_year_max (int): data up to July of clim_year_max will be used to calculate the climatology
+      clim (xarray Dataset): climatology returned by an earlier call for this period, calculated here if None
+
+   Returns:
+      xarray Dataset with the climatology, to be reused for other years of interest.
+   '''
+   def dates(y):
+      if CACHE_SCD:
+         return cached_snow_year(y, snow_year_dates, name='dates', variables=DATE_VARIABLES, dtype='f4')
+      return snow_year_dates(y)
+
+   if clim is None:
+      #running sum and count, so only one snow year is held in memory at a time
+      total, count = None, None
+      for y in range(clim_year_min, clim_year_max):
+         data = dates(y)[DATE_VARIABLES]
+         total = data.fillna(0) if total is None else total + data.fillna(0)
+         count = data.notnull().astype(int) if count is None else count + data.notnull()
+      clim = (total / count.where(count > 0)).load()
+
+   current = dates(year[0])[DATE_VARIABLES]
+   anom = xr.merge([current, (current - clim).rename({var: var+'_anom' for var in DATE_VARIABLES})])
+   anom.attrs = {} #drop the cache stamp
+
+   cut_data = crop_to_domain(anom)
+   file_name = 'anom_snow_dates_'+str(year[0])+'_'+str(year[1])+'_using_'+str(clim_year_min)+'_to_'+str(clim_year_max)+'.nc'
+   cut_data.to_netcdf(data_root / file_name)
+   return clim
+
+def products_to_netcdf(year, clim_year_min, clim_year_max, products, clim=None):
+   '''
+   Saves NetCDF files with the climatology and the anomalies in "year" of interest of 
+   several seasonal day counts at once. Each snow year is read once for all of them 
+   (see utils/snow_products.py), so adding products does not add reads of the data.
+
+   Args:
+      year (tuple of int): year of interest, e.g. [2017, 2018] for Aug 2017-July 2018 snow season.
+      clim_year_min (int): data after August of clim_year_min will be used to calculate the climatology
+      clim_year_max (int): data up to July of clim_year_max will be used to calculate the climatology
+      products (list of str): keys of PRODUCTS.
+      clim (xarray Dataset): climatology returned by an earlier call for this period and products,
+         calculated and saved here if None
+
+   Returns:
+      xarray Dataset with the climatology, to be reused for other years of interest.
+   '''
+   def counts(y):
+      if CACHE_SCD: #all products are cached, they cost the same single read
+         return cached_snow_year(y, snow_year_products, name='products', variables=list(PRODUCTS)+['valid_days'])
+      return snow_year_products(y, products)
+
+   if clim is None:
+      #running sum, so only one snow year is held in memory at a time
+      total = None
+      for y in range(clim_year_min, clim_year_max):
+         data = counts(y)[products+['valid_days']].astype('f8')
+         total = data if total is None else total + data
+      clim = (total / (clim_year_max - clim_year_min)).load()
+
+      cut_data = crop_to_domain(clim)
+      file_name = 'clim_products_'+str(clim_year_min)+'_'+str(clim_year_max)+'_using_'+str(clim_year_min)+'_'+str(clim_year_max)+'.nc'
+      cut_data.to_netcdf(data_root / file_name)
+
+   current = counts(year[0])
+   anom = (current[products] - clim[products]).assign(valid_days=current.valid_days) #valid_days is for the year of interest
+   anom.attrs = {} #drop the cache stamp
+
+   cut_data = crop_to_domain(anom)
+   file_name = 'anom_products_'+str(year[0])+'_'+str(year[1])+'_using_'+str(clim_year_min)+'_to_'+str(clim_year_max)+'.nc'
+   cut_data.to_netcdf(data_root / file_name)
+   return clim
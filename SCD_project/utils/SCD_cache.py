@@ -0,0 +1,153 @@
+## Created: Oct 18, 2026
+## Last edited: Oct 18, 2026
+
+import os
+import json
+import numpy as np
+import xarray as xr
+
+from utils.constants import IMS_files_loc
+
+SCD_CACHE_DIR = IMS_files_loc+'SCD_cache/'
+#seasonal SCD for each snow year is saved here as SCD_YYYY_YYYY.nc
+
+CACHE_VERSION = 2
+#part of every stamp, increased when the saved variables change so that files saved before are recomputed
+
+def source_stamp(year):
+   '''
+   Returns a string identifying the versions of the yearly IMS files that the
+   snow year (August, year)-(July, year+1) is computed from, using their size
+   and modification time, and CACHE_VERSION.
+   '''
+   stamp = ['version:'+str(CACHE_VERSION)]
+   for y in [year, year+1]:
+      fname = IMS_files_loc+'IMS_snowc_'+str(y)+'.nc'
+      if os.path.exists(fname):
+         st = os.stat(fname)
+         stamp.append('IMS_snowc_'+str(y)+'.nc:'+str(st.st_size)+':'+str(st.st_mtime_ns))
+      else:
+         stamp.append('IMS_snowc_'+str(y)+'.nc:missing')
+   return ';'.join(stamp)
+
+def cached_snow_year(year, compute, name='SCD', variables=('snowc', 'valid_days'), dtype='i2'):
+   '''
+   Returns seasonal SCD (or another product) for the snow year (August, year)-(July, year+1), 
+   read from SCD_CACHE_DIR if it was computed from the current versions of the yearly IMS
+   files and holds all the variables, otherwise computed with compute(year) and saved there.
+
+   Args:
+      year (int): first calendar year of the snow year.
+      compute (function): returns an xarray Dataset with variables snowc and
+         valid_days (season, yc, xc) for the snow year, see SCD_anomaly.calc_seasonal_SCD.
+      name (str): product name, used as the prefix of the saved file.
+      variables (list or tuple of str): variables of the product to keep.
+      dtype (str): datatype the variables are saved as. Day counts for a single 
+         snow year are integers, so SCD fits in int16.
+
+   Returns:
+      xarray Dataset with the variables.
+   '''
+   fname = SCD_CACHE_DIR+name+'_'+str(year)+'_'+str(year+1)+'.nc'
+   stamp = source_stamp(year)
+
+   if os.path.exists(fname):
+      with xr.open_dataset(fname) as cached:
+         if cached.attrs.get('source_stamp') == stamp and all(var in cached for var in variables):
+            return cached.load()
+
+   print('computing '+name+' for snow year '+str(year)+'-'+str(year+1))
+   data = compute(year)[list(variables)].compute()
+   for var in variables:
+      data[var] = data[var].astype(dtype)
+   data.attrs['source_stamp'] = stamp
+
+   os.makedirs(SCD_CACHE_DIR, exist_ok=True) #batch worker processes may create it at once
+   data.to_netcdf(fname, encoding={var: {'zlib': True} for var in variables})
+   return data
+
+def accumulate(state, data, sign):
+   '''
+   Adds (sign = 1) or removes (sign = -1) the SCD of one snow year to/from the 
+   climatology accumulator state, see clim_state.
+   '''
+   snowc = data.snowc.astype('f8')
+   if state is None:
+      state = xr.Dataset({'snowc_sum': xr.zeros_like(snowc), 'snowc_sumsq': xr.zeros_like(snowc),
+                          'count': xr.zeros_like(snowc), 'valid_days_sum': xr.zeros_like(data.valid_days, dtype='f8')})
+   state['snowc_sum'] = state.snowc_sum + sign*snowc.fillna(0)
+   state['snowc_sumsq'] = state.snowc_sumsq + sign*(snowc**2).fillna(0)
+   state['count'] = state['count'] + sign*snowc.notnull()
+   state['valid_days_sum'] = state.valid_days_sum + sign*data.valid_days
+   return state
+
+def clim_state(year_min, year_max, compute, name='clim'):
+   '''
+   Returns the climatology accumulator for the snow years between (August, year_min)
+   and (July, year_max): running sum, sum of squares and count of seasonal SCD for 
+   every grid square, and the sum of valid_days. The state is saved as 
+   SCD_CACHE_DIR/<name>_state.nc together with the snow years it holds, and moving 
+   to a new period only adds and removes the snow years that differ, e.g. 
+   1998-2017 -> 1999-2018 reads two snow years. If the IMS files of a snow year in 
+   the state have changed since it was added, the state is rebuilt.
+
+   Args:
+      year_min (int): first year of the climatological period.
+      year_max (int): last year of the climatological period.
+      compute (function): computes the SCD of one snow year, see cached_snow_year.
+      name (str): name of the saved state, use different names to keep several periods.
+
+   Returns:
+      xarray Dataset with variables snowc_sum, snowc_sumsq, count and valid_days_sum (season, yc, xc).
+   '''
+   fname = SCD_CACHE_DIR+name+'_state.nc'
+   state, stamps = None, {}
+
+   if os.path.exists(fname):
+      with xr.open_dataset(fname) as saved:
+         saved_stamps = json.loads(saved.attrs['stamps'])
+         if all(source_stamp(int(y)) == stamp for y, stamp in saved_stamps.items()):
+            state, stamps = saved.load(), saved_stamps
+         else:
+            print('IMS files changed, rebuilding climatology state '+name)
+
+   target = [str(y) for y in range(year_min, year_max)]
+   to_remove = [y for y in stamps if y not in target]
+   to_add = [y for y in target if y not in stamps]
+
+   for y in to_remove:
+      state = accumulate(state, cached_snow_year(int(y), compute), -1)
+      del stamps[y]
+   for y in to_add:
+      state = accumulate(state, cached_snow_year(int(y), compute), 1)
+      stamps[y] = source_stamp(int(y))
+
+   if to_remove or to_add:
+      state.attrs['stamps'] = json.dumps(stamps)
+      os.makedirs(SCD_CACHE_DIR, exist_ok=True)
+      state.to_netcdf(fname)
+
+   return state
+
+def clim_from_state(state):
+   '''
+   Returns the climatological mean (snowc) and standard deviation (snowc_std, 
+   population, i.e. ddof=0) of seasonal SCD, and the mean valid_days, from a 
+   climatology accumulator state, see clim_state.
+   '''
+   count = state['count'].where(state['count'] > 0)
+   mean = state.snowc_sum / count
+   variance = (state.snowc_sumsq / count - mean**2).clip(min=0) #clip round-off below zero
+   n_years = len(json.loads(state.attrs['stamps']))
+   return xr.Dataset({'snowc': mean, 'snowc_std': np.sqrt(variance), 'valid_days': state.valid_days_sum / n_years})
+
+def standardized_anomaly(data, clim):
+   '''
+   Returns (SCD - climatological mean) / climatological standard deviation, masked
+   where the standard deviation is zero.
+
+   Args:
+      data (xarray Dataset): seasonal SCD in variable snowc.
+      clim (xarray Dataset): output of clim_from_state.
+   '''
+   return (data.snowc - clim.snowc) / clim.snowc_std.where(clim.snowc_std > 0)
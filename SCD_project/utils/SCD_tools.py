@@ -11,7 +11,7 @@ import matplotlib as mpl
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 import matplotlib.ticker as mticker   
 
-from utils.IMS_tools import load_latlon
+from utils.IMS_tools import load_latlon, crop_to_domain
 
 def plot_2(data1, data2, lat, lon, name):
    fig_crs = ccrs.LambertAzimuthalEqualArea(central_latitude=90, central_longitude=-80)
@@ -26,10 +26,10 @@ def plot_2(data1, data2, lat, lon, name):
          (x[0]/255, x[1]/255, x[2]/255) for x in [(255,  47,  34), (255, 113,  57), (239, 162,   0), (255, 211,  66), (255, 255, 156), (255, 255, 255), (255, 255, 255), (255, 255, 255), (198, 255, 222), (140, 211, 255), ( 57, 195, 255), (  0, 150, 189), (  0,  95, 206)]],
       N=256 )
 
-   cut_data1 = data1[158:1024-158+1,158:1024-158+1]
-   cut_data2 = data2[158:1024-158+1,158:1024-158+1]
-   cut_lat = lat[158:1024-158+1,158:1024-158+1]
-   cut_lon = lon[158:1024-158+1,158:1024-158+1]
+   cut_data1 = crop_to_domain(data1)
+   cut_data2 = crop_to_domain(data2)
+   cut_lat = crop_to_domain(lat)
+   cut_lon = crop_to_domain(lon)
 
    #initialize canvas
 
@@ -22,9 +22,33 @@ IMS_DIR = '/data/kushner_group/IMS/'
 IMS_files_loc = '/users/jk/19/achereque/ARC/SCD_project/IMS_nc_output/'
 #set path to directory where reformatted IMS data should be saved
 
+FTP_WORKERS = 4
+#number of concurrent FTP connections used to download IMS files
+N_WORKERS = 1
+#number of processes used to decode raw IMS files when grouping them by year, 1 decodes one day at a time (serial, for debugging)
+BATCH_WORKERS = 1
+#number of processes calculating SCD anomalies when batch_years is set in SCD_anomaly_calc.py, 1 calculates one snow year at a time
+COMPACT_OUTPUT = True
+#True stores snow cover in the yearly NetCDF files as compressed, chunked uint8, False as uncompressed f4 (original format)
+PERSIST_CATALOG = False
+#True keeps the listing of each raw IMS year directory in IMS_DIR/catalog_YYYY.json, reused while the directory is unchanged
+SNOW_BITS = False
+#True also builds bit-packed daily snow masks (IMS_snowbits_YYYY.nc, see snow_bits.py) during setup and computes seasonal SCD from them
+CROP_DOMAIN = False
+#True stores only the valid domain [158:867, 158:867] of the IMS grid in the yearly NetCDF files, the offset is kept in attributes yc_offset/xc_offset
+SNOW_CUMSUM = False
+#True also builds cumulative snow day indexes (IMS_snowcum_YYYY.nc, see snow_cumsum.py) during setup, for SCD over custom seasons
+CACHE_SCD = True
+#True saves the seasonal SCD of each snow year in IMS_files_loc/SCD_cache/ and reuses it until that year's NetCDF files change
+STREAM_DOWNLOAD = False
+#True makes the yearly NetCDF files in setup straight from the FTP server, decoding each file as it downloads (FTP_WORKERS at a time), DOWNLOAD_DATA then only fetches the lat/lon grids
+KEEP_RAW = True
+#with STREAM_DOWNLOAD, True also saves the raw files to IMS_DIR, False keeps no raw files
+
 EMPTY_PATH = '/data/kushner_group/IMS/EMPTY_GZ/empty_file.gz'
 #EMPTY_PATH is a txt file created by saving a 1024x1024 array of zeros to file
 #if file doesn't exist yet, use create_empty_IMS.py
+#raw_to_nc_IMS does not read it, days with no file are stored as no data (fill value) instead
 
 
 
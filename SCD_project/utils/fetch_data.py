@@ -3,83 +3,184 @@
 
 ## Adapted: Aleksandra Elias Chereque
 ## Created: July 13, 2020
-## Last edited: Aug 6, 2020
+## Last edited: Oct 18, 2026
 
 import os
-from ftplib import FTP
+import time
+import zlib
+import threading
+import ftplib
 
-from utils.constants import RUN_SETUP, IMS_DIR
+from utils.constants import RUN_SETUP, IMS_DIR, FTP_WORKERS, KEEP_RAW
+from utils.ftp_sync import RETRIES, BACKOFF, connect, remote_files, sync_files, record_manifest
+from utils.IMS_tools import index_files, catalog_from_listings, decode_packed, decode_unpacked
 
-def download(ftp, download_dir, fname):
+IMS_FTP_DIR = 'DATASETS/NOAA/G02156/24km/' #daily files are in a directory per year
+
+def download_full_IMS_year(year):
    '''
-   Retrieve file in binary transfer mode, write to file locally.
+   Given relevant year, downloads all IMS files for the year to IMS_DIR. Files already 
+   downloaded and unchanged are skipped, see ftp_sync.sync_files.
 
    Args:
-      ftp: relevant instance of FTP class, pointing to correct directory
-      download_dir (str): path to directory to save these files locally
-      fname: filename accessed via FTP, used to name file locally
+      year (int): relevant year, must be from 1998-present.
    '''
+   
+   sync_files(IMS_FTP_DIR+str(year)+'/', IMS_DIR+str(year)+'/', workers=FTP_WORKERS)
+      
+def update_current_y_IMS(current_year):
+   '''
+   Downloads IMS Data to bring current year up to date. The remote listing is compared 
+   with the manifest IMS_DIR/manifest_YYYY.json, so only new or changed files are 
+   downloaded, see ftp_sync.sync_files. The files returned are only recorded in the 
+   manifest by record_current_y_IMS, so files downloaded by an update that failed 
+   before they were decoded are returned again by the next one.
+
+   Args:
+      current_year (int): year to update, normally current_y.
 
-   if not os.path.exists(download_dir):
-      os.makedirs(download_dir)
+   Returns:
+      dict {filename: (size, modified)} of the files new or changed since the last 
+      recorded update, see group_IMS_year.update_nc_IMS.
+   '''
 
-   local_filename = download_dir+str(fname)
-   lf = open(local_filename, 'wb')
-   ftp.retrbinary('retr ' + fname, lf.write)
-   lf.close()
+   return sync_files(IMS_FTP_DIR+str(current_year)+'/', IMS_DIR+str(current_year)+'/',
+                     workers=FTP_WORKERS, manifest=IMS_manifest(current_year))
 
-def download_full_IMS_year(year):
+def record_current_y_IMS(current_year, new_files):
    '''
-   Given relevant year, downloads all IMS files for the year to IMS_DIR.
+   Records the files returned by update_current_y_IMS in the manifest, once their days are decoded.
 
    Args:
-      year (int): relevant year, must be from 1998-present.
+      current_year (int): year updated, normally current_y.
+      new_files (dict): as returned by update_current_y_IMS.
    '''
-   
-   ftp = FTP('sidads.colorado.edu')
-   ftp.login()
-   ftp.cwd('DATASETS/NOAA/G02156/24km/'+str(year)+'/')
-
-   listing = []
-   ftp.retrlines('LIST', listing.append)
-
-   for i in range(2, len(listing)): #start from 2 to skip the '.' and '..' directories, listed first
-      words = listing[i].split(None, 8)
-      filename = words[-1].lstrip()
-      print('Downloading =>', filename)
-      download(ftp, IMS_DIR+str(year)+'/', filename)
-      
-def update_current_y_IMS(current_year):
+
+   record_manifest(IMS_manifest(current_year), new_files)
+
+def IMS_manifest(year):
    '''
-   Downloads IMS Data to bring current year up to date.
+   Returns the path of the manifest of the IMS files of year, see update_current_y_IMS.
    '''
-   
-   ftp = FTP('sidads.colorado.edu')
-   ftp.login()
-   ftp.cwd('DATASETS/NOAA/G02156/24km/'+str(current_y)+'/')
 
-   listing = []
-   ftp.retrlines('LIST', listing.append)
-   
-   for i in range(1, len(listing)):
-      words = listing[-i].split(None, 8)
-      filename = words[-1].lstrip()
-      if os.path.exists(IMS_DIR+str(current_year)+'/'+filename):
-         print('Directory is up to date, downloaded '+str(i)+' new days.')
+   return IMS_DIR+'manifest_'+str(year)+'.json'
+
+_remote_modified = {} #path in IMS_DIR -> modification time of the remote file, filled by remote_IMS_catalog
+
+def remote_IMS_catalog(year):
+   '''
+   Returns the catalog of year (see IMS_tools.build_catalog) from the files on the 
+   FTP server, so that days can be streamed (see stream_IMS_day) without downloading 
+   the raw files to IMS_DIR first.
+   '''
+
+   listings = []
+   for y in [year, year+1]:
+      try:
+         ftp = connect(IMS_FTP_DIR+str(y)+'/')
+      except ftplib.error_perm: #no directory for the next year yet
+         listings.append({})
+         continue
+      remote = remote_files(ftp)
+      ftp.quit()
+      _remote_modified.update({IMS_DIR+str(y)+'/'+name: modified for name, (size, modified) in remote.items()})
+      listings.append(index_files(remote))
+   return catalog_from_listings(year, *listings)
+
+def stream_file(ftp, fname, keep_dir=None, modified=None):
+   '''
+   Retrieves gzipped file fname in binary transfer mode and returns its uncompressed 
+   content, decompressing the bytes as they arrive. Nothing is written locally unless 
+   keep_dir is given, then the raw file is also saved there, with the remote modification 
+   time modified (seconds since epoch) if known, as ftp_sync.download does.
+   '''
+
+   decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) #expect a gzip header
+   chunks = []
+
+   if keep_dir is not None:
+      os.makedirs(keep_dir, exist_ok=True) #several threads may create it at once
+      raw = open(keep_dir+fname+'.part', 'wb')
+
+   def receive(block):
+      chunks.append(decompressor.decompress(block))
+      if keep_dir is not None:
+         raw.write(block)
+
+   try:
+      ftp.retrbinary('RETR ' + fname, receive)
+   finally:
+      if keep_dir is not None:
+         raw.close()
+
+   chunks.append(decompressor.flush())
+   if not decompressor.eof:
+      raise OSError('incomplete download of '+fname)
+   if keep_dir is not None:
+      os.replace(keep_dir+fname+'.part', keep_dir+fname)
+      if modified is not None:
+         os.utime(keep_dir+fname, (modified, modified))
+   return b''.join(chunks)
+
+_streams = threading.local() #FTP connections of the thread streaming IMS files, one per remote directory
+_stream_connections = []
+
+def stream_IMS_day(entry, keep_raw=KEEP_RAW):
+   '''
+   Returns the IMS snow cover array and date for one day, as group_IMS_year.read_day, 
+   but streams the file from the FTP server into the decoder instead of reading it 
+   from IMS_DIR. Each thread reuses its connections, and failed transfers are retried 
+   as in ftp_sync.sync_files.
+
+   Args:
+      entry (tuple): (path, version, packed, date) catalog entry for the day, see remote_IMS_catalog.
+      keep_raw (bool): also save the raw file to IMS_DIR.
+   '''
+
+   path, version, packed, date = entry
+   if version is None:
+      return None, date
+
+   year_dir = os.path.basename(os.path.dirname(path))+'/'
+   fname = os.path.basename(path)
+   if not hasattr(_streams, 'ftp'):
+      _streams.ftp = {}
+
+   for attempt in range(RETRIES):
+      try:
+         if year_dir not in _streams.ftp:
+            _streams.ftp[year_dir] = connect(IMS_FTP_DIR+year_dir)
+            _stream_connections.append(_streams.ftp[year_dir])
+         content = stream_file(_streams.ftp[year_dir], fname, IMS_DIR+year_dir if keep_raw else None, _remote_modified.get(path))
          break
-      else:
-         print('Downloading =>', filename)
-         download(ftp, current_y, filename)
+      except ftplib.all_errors as err:
+         _streams.ftp.pop(year_dir, None) #the connection may be broken, open a new one
+         if attempt == RETRIES - 1:
+            raise
+         print('Retrying '+fname+' after error: '+repr(err))
+         time.sleep(BACKOFF * 2**attempt)
+
+   if packed:
+      return decode_packed(content), date
+   return decode_unpacked(content[1280:]), date #skip 1280 bytes within the header, see IMS_tools.read_unpacked
+
+def close_streams():
+   '''
+   Closes the FTP connections opened by stream_IMS_day.
+   '''
+
+   while _stream_connections:
+      connection = _stream_connections.pop()
+      try:
+         connection.quit()
+      except ftplib.all_errors:
+         connection.close()
 
 def download_IMS_latlon():
    '''
    Downloads latitude and longitude grids for IMS data to IMS_DIR.
    '''
 
-   ftp = FTP('sidads.colorado.edu')
-   ftp.login()
-   ftp.cwd('DATASETS/NOAA/G02156/metadata/')
-
-   download(ftp, IMS_DIR, 'imslat_24km.bin.gz')
-   download(ftp, IMS_DIR, 'imslon_24km.bin.gz')
+   grids = ['imslat_24km.bin.gz', 'imslon_24km.bin.gz']
+   sync_files('DATASETS/NOAA/G02156/metadata/', IMS_DIR, select=lambda name: name in grids, workers=FTP_WORKERS)
 
@@ -2,14 +2,126 @@
 ## Created: July 6, 2020
 ## Last edited: Aug 13, 2020
 
+import os
 import numpy as np
-from netCDF4 import Dataset, num2date, date2num
+from netCDF4 import Dataset, date2num
 import time as t
-
-from utils.constants import current_y, max_day_downloaded, IMS_files_loc
-from utils.IMS_tools import load_latlon, year_len, file_and_date, list_unpacked_days, read_packed, read_unpacked
-
-def raw_to_nc_IMS(year):
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from utils.constants import current_y, max_day_downloaded, IMS_files_loc, N_WORKERS, COMPACT_OUTPUT, CROP_DOMAIN, FTP_WORKERS, STREAM_DOWNLOAD
+from utils.IMS_tools import load_latlon, year_len, build_catalog, read_packed, read_unpacked, crop_to_domain, DOMAIN_OFFSET
+from utils.fetch_data import remote_IMS_catalog, stream_IMS_day, close_streams
+
+#snow cover categories, see Table 3 of the IMS documentation
+SNOWC_FLAG_VALUES = np.array([0, 1, 2, 3, 4], dtype=np.uint8)
+SNOWC_FLAG_MEANINGS = 'outside_northern_hemisphere open_water land_without_snow sea_or_lake_ice snow_covered_land'
+
+#fill value of snowc on days with no IMS file, see 'missing' in IMS_tools
+SNOWC_NO_DATA = 255
+
+#chunks of 32 days x 128 x 128 squares (512 KB) keep both one-day maps
+#(64 chunks) and single-pixel time series (12 chunks per year) cheap to read
+SNOWC_CHUNKS = (32, 128, 128)
+
+#rows of the grid processed at a time by snow_bits, snow_cumsum and snow_dates, one row of snowc chunks
+ROW_BLOCK = SNOWC_CHUNKS[1]
+
+def snowc_storage(ntimes, compact=COMPACT_OUTPUT):
+   '''
+   Returns the datatype and createVariable keyword arguments for snowc.
+
+   Args:
+      ntimes (int): length of the time dimension.
+      compact (bool): if True, store categories as zlib/shuffle compressed, chunked
+         uint8. If False, use the original uncompressed f4 layout.
+   '''
+   if not compact:
+      return 'f4', {'fill_value': SNOWC_NO_DATA}
+   chunks = (min(SNOWC_CHUNKS[0], ntimes),) + SNOWC_CHUNKS[1:]
+   return 'u1', {'zlib': True, 'complevel': 4, 'shuffle': True, 'chunksizes': chunks, 'fill_value': SNOWC_NO_DATA}
+
+def read_day(entry):
+   '''
+   Returns the IMS snow cover array and date for one day. The array is None
+   if there is no file for the day, so nothing is read.
+
+   Args:
+      entry (tuple): (path, version, packed, date) catalog entry for the day, see IMS_tools.build_catalog.
+   '''
+   path, version, packed, date = entry
+   if version is None:
+      snowc_vals = None
+   elif packed:
+      snowc_vals = read_packed(path)
+   else:
+      snowc_vals = read_unpacked(path)
+   return snowc_vals, date
+
+def write_days(snowc, times, catalog, days, workers=N_WORKERS, stream=False):
+   '''
+   Decodes days and writes them into snowc and times, where day i (counting 
+   from 1) goes to index i-1. If snowc only holds the valid domain, the days are 
+   cut to it.
+
+   Args:
+      snowc, times: netCDF4 Variable instances to write to.
+      catalog (dict): catalog for the year, see IMS_tools.build_catalog.
+      days (range or list): days of year to decode, in order.
+      workers (int): number of worker processes, see raw_to_nc_IMS.
+      stream (bool): stream the files from the FTP server instead of reading them
+         from IMS_DIR, FTP_WORKERS at a time (catalog from fetch_data.remote_IMS_catalog).
+   '''
+   entries = [catalog[i] for i in days]
+
+   if stream: #threads, so that transfers and decoding overlap while this process writes
+      try:
+         with ThreadPoolExecutor(max_workers=FTP_WORKERS) as pool:
+            store_days(snowc, times, days, pool.map(stream_IMS_day, entries), pool)
+      finally: #the threads' connections are closed even if a day failed
+         close_streams()
+   elif workers > 1:
+      with ProcessPoolExecutor(max_workers=workers) as pool:
+         store_days(snowc, times, days, pool.map(read_day, entries, chunksize=8), pool)
+   else:
+      store_days(snowc, times, days, (read_day(entry) for entry in entries))
+
+def store_days(snowc, times, days, decoded, pool=None):
+   '''
+   Writes decoded days (snowc array, date) into snowc and times in order, see write_days.
+   If a day fails, the days not started yet in pool are cancelled before the error is raised.
+   '''
+   try:
+      for i, (snowc_vals, date) in zip(days, decoded):
+         if pool is None:
+            print(i)
+
+         if snowc_vals is not None: #days with no data are left as SNOWC_NO_DATA
+            snowc[i-1,:,:] = crop_to_domain(snowc_vals) if snowc.shape[-1] != 1024 else snowc_vals
+
+         #date2num converts datetime objects to numeric values of time in the specified units and calendar
+
+         times[i-1] = date2num(date, units=times.units, calendar=times.calendar)
+   except BaseException:
+      if pool is not None:
+         pool.shutdown(cancel_futures=True) #waits only for the days already running
+      raise
+
+def raw_to_nc_IMS(year, workers=N_WORKERS, compact=COMPACT_OUTPUT, crop=CROP_DOMAIN, stream=STREAM_DOWNLOAD):
+   '''
+   Groups one year of raw IMS files into a NetCDF file in IMS_files_loc.
+
+   Args:
+      year (int): year of interest.
+      workers (int): number of worker processes decoding days. With 1 (serial mode,
+         useful for debugging) each day is decoded and written in turn. Otherwise
+         days are decoded in a process pool and written in date order by this
+         process only, so the output is the same as in serial mode.
+      compact (bool): store snowc as compressed, chunked uint8 (see snowc_storage).
+      crop (bool): store only the valid domain of the grid (IMS_tools.DOMAIN_SLICE), 
+         with its offset in the yc_offset and xc_offset attributes.
+      stream (bool): decode the files as they are downloaded from the FTP server, 
+         instead of reading them from IMS_DIR (see write_days).
+   '''
    print('starting year '+str(year))
    #open new dataset
    rootgrp = Dataset(IMS_files_loc+'IMS_snowc_'+str(year)+'.nc', 'w', format='NETCDF4')
@@ -18,12 +130,19 @@ def raw_to_nc_IMS(year):
    #method of Dataset. Name dimension with str, set size with int.
 
    if year == current_y:
-      time = rootgrp.createDimension('time', max_day_downloaded)
+      ndays = max_day_downloaded
+      time = rootgrp.createDimension('time', None) #unlimited, so that new days can be added with update_nc_IMS
+   else:
+      ndays = year_len(year)
+      time = rootgrp.createDimension('time', ndays)
+
+   if crop:
+      ngrid = 1024 - 2*DOMAIN_OFFSET + 1
    else:
-      time = rootgrp.createDimension('time', year_len(year))
+      ngrid = 1024
 
-   xc = rootgrp.createDimension('xc', 1024) #x cartesian coordinate
-   yc = rootgrp.createDimension('yc', 1024) #y cartesian coordinate
+   xc = rootgrp.createDimension('xc', ngrid) #x cartesian coordinate
+   yc = rootgrp.createDimension('yc', ngrid) #y cartesian coordinate
 
    #use the createVariable method of Dataset, which has two mandatory
    #arguments, variable name and variable datatype. Variable dimensions 
@@ -39,7 +158,8 @@ def raw_to_nc_IMS(year):
 
    #create variable that is not a dimension
    latlon = rootgrp.createVariable('latitude_longitude', 'i4')
-   snowc = rootgrp.createVariable('snowc', 'f4', ('time', 'yc', 'xc',))
+   snowc_dtype, snowc_kwargs = snowc_storage(ndays, compact)
+   snowc = rootgrp.createVariable('snowc', snowc_dtype, ('time', 'yc', 'xc',), **snowc_kwargs)
 
    #Set global and variable attributes 
 
@@ -57,6 +177,8 @@ def raw_to_nc_IMS(year):
    snowc.standard_name = 'snow_cover_type'
    snowc.coordinates = 'latitude longitude'
    snowc.grid_mapping = 'latitude_longitude'
+   snowc.flag_values = SNOWC_FLAG_VALUES.astype(snowc_dtype)
+   snowc.flag_meanings = SNOWC_FLAG_MEANINGS
 
    times.units = 'hours since 0001-01-01 00:00:00.0'
    times.calendar = 'gregorian'
@@ -65,6 +187,8 @@ def raw_to_nc_IMS(year):
    rootgrp.Conventions = 'CF-1.6'
    rootgrp.description = 'Aggregated IMS snow cover and sea ice for one calendar year'
    rootgrp.history = 'Created ' + t.ctime(t.time())
+   rootgrp.yc_offset = DOMAIN_OFFSET if crop else 0 #index of the first row/column in the full 1024x1024 IMS grid
+   rootgrp.xc_offset = DOMAIN_OFFSET if crop else 0
 
    times.units = 'hours since 0001-01-01 00:00:00.0'
    times.calendar = 'gregorian'
@@ -73,27 +197,55 @@ def raw_to_nc_IMS(year):
 
    lat_vals, lon_vals = load_latlon()
 
+   if crop:
+      lat_vals, lon_vals = crop_to_domain(lat_vals), crop_to_domain(lon_vals)
+
    lats[:] = lat_vals
    lons[:] = lon_vals
 
-   unpacked_days = list_unpacked_days(year)
-
-   for i in range(1, len(times)+1):
-      print(i)
-      path, date = file_and_date(i, year)
-      if (year == 1997) or (year == 1998):
-         if np.isin(i, unpacked_days):
-            snowc_vals = read_unpacked(path)
-         else:
-            snowc_vals = read_packed(path)
-      else:
-         snowc_vals = read_packed(path)
+   catalog = remote_IMS_catalog(year) if stream else build_catalog(year)
+   write_days(snowc, times, catalog, range(1, ndays+1), workers, stream)
 
-      snowc[i-1,:,:] = snowc_vals
+   rootgrp.close()
+   print('done year: '+str(year))
 
-      #date2num converts datetime objects to numeric values of time in the specified units and calendar
+def update_nc_IMS(year, fnames, workers=N_WORKERS):
+   '''
+   Decodes the days held by raw files fnames, e.g. the files returned by 
+   fetch_data.update_current_y_IMS, into the NetCDF file for year. Days already stored 
+   are overwritten with the new files, days after the last one stored are appended 
+   (with any days in between, stored as no data if they have no file). If the file 
+   does not exist yet, or was written with a fixed-size time dimension, the whole 
+   year is rebuilt with raw_to_nc_IMS instead.
+
+   Args:
+      year (int): year of interest, normally current_y.
+      fnames (list or dict of str): names of the raw IMS files that are new or changed.
+      workers (int): number of worker processes, see raw_to_nc_IMS.
+   '''
+   fname = IMS_files_loc+'IMS_snowc_'+str(year)+'.nc'
+   if not os.path.exists(fname):
+      return raw_to_nc_IMS(year, workers)
+
+   rootgrp = Dataset(fname, 'a')
+   if not rootgrp.dimensions['time'].isunlimited():
+      rootgrp.close()
+      return raw_to_nc_IMS(year, workers)
+
+   times = rootgrp.variables['time']
+   snowc = rootgrp.variables['snowc']
+
+   catalog = build_catalog(year, refresh=True)
+   fnames = set(fnames)
+   days = [day for day, (path, version, packed, date) in catalog.items() if os.path.basename(path) in fnames]
+
+   if not days:
+      print('year '+str(year)+' is up to date')
+   else:
+      stored = len(times) #day i is stored at index i-1
+      days = sorted(set(day for day in days if day <= stored) | set(range(stored+1, max(days)+1)))
+      print('updating days '+', '.join(str(day) for day in days)+' of year '+str(year))
+      write_days(snowc, times, catalog, days, workers)
+      rootgrp.history += '\nUpdated days '+', '.join(str(day) for day in days)+' ' + t.ctime(t.time())
 
-      times[i-1] = date2num(date, units=times.units, calendar=times.calendar)
-      
    rootgrp.close()
-   print('done year: '+str(year))
@@ -0,0 +1,157 @@
+## Created: Oct 18, 2026
+## Last edited: Oct 18, 2026
+
+import numpy as np
+import xarray as xr
+from netCDF4 import Dataset
+import time as t
+from datetime import datetime
+
+from utils.constants import IMS_files_loc
+from utils.group_IMS_year import ROW_BLOCK
+from utils.IMS_tools import load_latlon, crop_to_domain
+
+#number of set bits in each possible byte
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def nc_to_bits_IMS(year):
+   '''
+   Builds the snow mask file IMS_snowbits_YYYY.nc from IMS_snowc_YYYY.nc, both in
+   IMS_files_loc. For every grid square, the days with snow (snowc == 4) are
+   packed along time into bits, so variable snowbits(yc, xc, byte) holds
+   day 1-8 of the year in byte 0 (day 1 is the highest bit), day 9-16 in byte 1,
+   etc. A year takes 1024*1024*46 bytes (~128 KB per day) before compression.
+   Variable valid(time) is 1 on days with IMS data and 0 on days with no data.
+
+   Args:
+      year (int): year of interest, IMS_snowc_YYYY.nc must exist.
+   '''
+   src = Dataset(IMS_files_loc+'IMS_snowc_'+str(year)+'.nc', 'r')
+   src.set_auto_mask(False) #keep uint8, no data is not snow
+   snowc = src.variables['snowc']
+   ndays, ny, nx = snowc.shape
+   nbytes = (ndays + 7) // 8
+
+   rootgrp = Dataset(IMS_files_loc+'IMS_snowbits_'+str(year)+'.nc', 'w', format='NETCDF4')
+
+   rootgrp.createDimension('time', ndays)
+   rootgrp.createDimension('yc', ny)
+   rootgrp.createDimension('xc', nx)
+   rootgrp.createDimension('byte', nbytes) #days of year packed 8 to a byte
+
+   times = rootgrp.createVariable('time', 'f8', ('time',))
+   valid = rootgrp.createVariable('valid', 'u1', ('time',))
+   snowbits = rootgrp.createVariable('snowbits', 'u1', ('yc', 'xc', 'byte',), zlib=True, complevel=4, chunksizes=(ROW_BLOCK, nx, nbytes))
+
+   times.units = src.variables['time'].units
+   times.calendar = src.variables['time'].calendar
+   times.standard_name = 'time'
+
+   valid.long_name = '1 if IMS data exists for the day, 0 otherwise'
+
+   snowbits.long_name = 'snow covered land (snowc == 4) on each day of year, packed along time with numpy.packbits'
+   snowbits.ndays = ndays
+
+   rootgrp.Conventions = 'CF-1.6'
+   rootgrp.description = 'Daily IMS snow mask for one calendar year, one bit per grid square per day'
+   rootgrp.history = 'Created ' + t.ctime(t.time()) + ' from IMS_snowc_'+str(year)+'.nc'
+
+   times[:] = src.variables['time'][:]
+
+   fill = getattr(snowc, '_FillValue', None)
+   day_valid = np.zeros(ndays, dtype=bool) if fill is not None else np.ones(ndays, dtype=bool)
+
+   for row in range(0, ny, ROW_BLOCK):
+      block = snowc[:, row:row+ROW_BLOCK, :] #(time, rows, xc)
+      if fill is not None: #a day with no data is fill everywhere
+         day_valid |= np.any(block != fill, axis=(1, 2))
+      packed = np.packbits(block == 4, axis=0) #(byte, rows, xc)
+      snowbits[row:row+ROW_BLOCK, :, :] = np.transpose(packed, (1, 2, 0))
+
+   valid[:] = day_valid
+
+   src.close()
+   rootgrp.close()
+   print('done snow mask for year: '+str(year))
+
+def load_bits(year):
+   '''
+   Returns the packed snow mask (yc, xc, byte) for year, the number of days
+   stored and the validity flag of each day, see nc_to_bits_IMS.
+   '''
+   with Dataset(IMS_files_loc+'IMS_snowbits_'+str(year)+'.nc', 'r') as f:
+      bits = f.variables['snowbits'][:].data
+      valid = f.variables['valid'][:].data
+      ndays = int(f.variables['snowbits'].ndays)
+   return bits, ndays, valid
+
+def window_mask(first_day, last_day, nbytes):
+   '''
+   Returns a byte array with the bits of days first_day-last_day (days of year,
+   counting from 1, inclusive) set, laid out as in nc_to_bits_IMS.
+   '''
+   days = np.zeros(nbytes*8, dtype=bool)
+   days[first_day-1:last_day] = True
+   return np.packbits(days)
+
+def count_days(bits, first_day, last_day):
+   '''
+   Counts the days with snow between first_day and last_day (days of year,
+   counting from 1, inclusive) for every grid square, using a popcount table
+   on the packed bits.
+
+   Args:
+      bits (array): packed snow mask (yc, xc, byte), see load_bits.
+      first_day (int): first day of the window.
+      last_day (int): last day of the window, may be past the last day stored.
+
+   Returns:
+      array (yc, xc) of uint16 day counts.
+   '''
+   mask = window_mask(first_day, last_day, bits.shape[-1])
+   counts = np.zeros(bits.shape[:2], dtype=np.uint16)
+   for b in np.nonzero(mask)[0]: #one byte plane at a time keeps memory at one 2D array
+      counts += POPCOUNT[bits[:, :, b] & mask[b]]
+   return counts
+
+def seasonal_SCD_from_bits(year_min, year_max):
+   '''
+   Returns the same SCD as SCD_anomaly.calc_seasonal_SCD(load_years(year_min, year_max)),
+   computed from the packed snow masks instead of the daily snow cover. Seasons are
+   the 6-month periods Aug-Jan (labelled 'SON') and Feb-Jul (labelled 'MAM'), averaged
+   over the snow years between August of year_min and July of year_max.
+
+   Args:
+      year_min (int): data after August of this year is used.
+      year_max (int): data up to July of this year is used.
+
+   Returns:
+      xarray Dataset with variables snowc (season, yc, xc) and valid_days (season, yc, xc).
+   '''
+   son, mam = [], []
+   son_valid, mam_valid = [], []
+   bits, ndays, valid = load_bits(year_min)
+   for year in range(year_min, year_max):
+      aug_1 = datetime(year, 8, 1).timetuple().tm_yday
+      next_bits, next_ndays, next_valid = load_bits(year+1)
+
+      son.append(count_days(bits, aug_1, ndays) + count_days(next_bits, 1, 31))
+      son_valid.append(int(valid[aug_1-1:].sum()) + int(next_valid[:31].sum()))
+
+      jul_31 = datetime(year+1, 7, 31).timetuple().tm_yday
+      mam.append(count_days(next_bits, 32, jul_31))
+      mam_valid.append(int(next_valid[31:jul_31].sum()))
+
+      bits, ndays, valid = next_bits, next_ndays, next_valid
+
+   lat, lon = load_latlon()
+   if bits.shape[1] != lon.shape[1]: #snow masks built from files written with CROP_DOMAIN
+      lat, lon = crop_to_domain(lat), crop_to_domain(lon)
+   snowc = np.stack([np.mean(mam, axis=0), np.mean(son, axis=0)])
+   #a day with no data has no data on the whole grid, so every grid square has the count of days with data
+   valid_days = np.array([np.mean(mam_valid), np.mean(son_valid)])[:, None, None] * np.ones(snowc.shape[1:])
+   data = xr.Dataset(
+      {'snowc': (('season', 'yc', 'xc'), snowc),
+       'valid_days': (('season', 'yc', 'xc'), valid_days)},
+      coords={'season': ['MAM', 'SON'], 'latitude': (('yc', 'xc'), lat), 'longitude': (('yc', 'xc'), lon)})
+   return data
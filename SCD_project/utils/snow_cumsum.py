@@ -0,0 +1,135 @@
+## Created: Oct 18, 2026
+## Last edited: Oct 18, 2026
+
+import numpy as np
+import xarray as xr
+from netCDF4 import Dataset
+import time as t
+import calendar
+from datetime import datetime
+
+from utils.constants import IMS_files_loc
+from utils.group_IMS_year import ROW_BLOCK
+from utils.IMS_tools import load_latlon, crop_to_domain
+
+def nc_to_cumsum_IMS(year):
+   '''
+   Builds the snow day index IMS_snowcum_YYYY.nc from IMS_snowc_YYYY.nc, both in
+   IMS_files_loc. Variable snowcum(time, yc, xc) holds, for every grid square, the
+   number of days with snow (snowc == 4) from January 1 up to and including each
+   day, so the SCD of any window of days is the difference of two time steps
+   (see window_SCD). Values are at most 366, stored as compressed uint16.
+
+   Args:
+      year (int): year of interest, IMS_snowc_YYYY.nc must exist.
+   '''
+   src = Dataset(IMS_files_loc+'IMS_snowc_'+str(year)+'.nc', 'r')
+   src.set_auto_mask(False) #keep uint8, no data is not snow
+   snowc = src.variables['snowc']
+   ndays, ny, nx = snowc.shape
+
+   rootgrp = Dataset(IMS_files_loc+'IMS_snowcum_'+str(year)+'.nc', 'w', format='NETCDF4')
+
+   rootgrp.createDimension('time', ndays)
+   rootgrp.createDimension('yc', ny)
+   rootgrp.createDimension('xc', nx)
+
+   times = rootgrp.createVariable('time', 'f8', ('time',))
+   snowcum = rootgrp.createVariable('snowcum', 'u2', ('time', 'yc', 'xc',), zlib=True, complevel=4, shuffle=True, chunksizes=(min(32, ndays), ROW_BLOCK, ROW_BLOCK))
+
+   times.units = src.variables['time'].units
+   times.calendar = src.variables['time'].calendar
+   times.standard_name = 'time'
+
+   snowcum.long_name = 'count of days with snow covered land (snowc == 4) since January 1, up to and including this day'
+   snowcum.units = 'days'
+
+   rootgrp.Conventions = 'CF-1.6'
+   rootgrp.description = 'Cumulative IMS snow day count for one calendar year'
+   rootgrp.history = 'Created ' + t.ctime(t.time()) + ' from IMS_snowc_'+str(year)+'.nc'
+
+   times[:] = src.variables['time'][:]
+
+   for row in range(0, ny, ROW_BLOCK):
+      block = snowc[:, row:row+ROW_BLOCK, :] #(time, rows, xc)
+      snowcum[:, row:row+ROW_BLOCK, :] = np.cumsum(block == 4, axis=0, dtype=np.uint16)
+
+   src.close()
+   rootgrp.close()
+   print('done snow day index for year: '+str(year))
+
+def window_SCD(year, first_day, last_day):
+   '''
+   Returns the count of days with snow between first_day and last_day (days of
+   year, counting from 1, inclusive) of year for every grid square, from two time
+   steps of IMS_snowcum_YYYY.nc. Days past the last one stored are not counted.
+
+   Returns:
+      array (yc, xc) of int counts.
+   '''
+   with Dataset(IMS_files_loc+'IMS_snowcum_'+str(year)+'.nc', 'r') as f:
+      snowcum = f.variables['snowcum']
+      last = min(last_day, snowcum.shape[0])
+      if last < first_day:
+         return np.zeros(snowcum.shape[1:], dtype=np.int32)
+      counts = snowcum[last-1, :, :].astype(np.int32)
+      if first_day > 1:
+         counts -= snowcum[first_day-2, :, :].astype(np.int32)
+   return counts
+
+def SCD_between(start, end):
+   '''
+   Returns the count of days with snow from date start to date end (inclusive,
+   datetime objects) for every grid square, summing window_SCD over the calendar
+   years the period covers. Raises ValueError if start is after end.
+   '''
+   if start > end:
+      raise ValueError('start '+start.strftime('%Y-%m-%d')+' is after end '+end.strftime('%Y-%m-%d'))
+   counts = None
+   for year in range(start.year, end.year+1):
+      first = start if year == start.year else datetime(year, 1, 1)
+      last = end if year == end.year else datetime(year, 12, 31)
+      year_counts = window_SCD(year, first.timetuple().tm_yday, last.timetuple().tm_yday)
+      counts = year_counts if counts is None else counts + year_counts
+   return counts
+
+def custom_seasonal_SCD(year_min, year_max, seasons):
+   '''
+   Returns SCD for any set of seasons, averaged over the snow years between
+   (August, year_min) and (July, year_max), from the snow day index.
+
+   Args:
+      year_min (int): first year of the period.
+      year_max (int): last year of the period.
+      seasons (dict): season name -> ((month, day), (month, day)), first and last
+         day of the season (inclusive). Dates in August-December fall in the first
+         calendar year of the snow year, dates in January-July in the second. (2, 29)
+         is moved to February 28 in years that are not leap years. The first day must not be after
+         the last, so a season cannot cross July 31/August 1. E.g. {'SON': ((9, 1), (11, 30)), 'onset': ((10, 15), (12, 15))}.
+
+   Returns:
+      xarray Dataset with variable snowc (season, yc, xc).
+   '''
+   def snow_year_date(year, month_day):
+      month, day = month_day
+      if not 1 <= day <= calendar.monthrange(2000, month)[1]: #2000 is a leap year
+         raise ValueError('no day '+str(day)+' in month '+str(month))
+      year = year if month > 7 else year+1
+      return datetime(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+   fields = []
+   for name, (first, last) in seasons.items():
+      for year in range(year_min, year_max):
+         if snow_year_date(year, first) > snow_year_date(year, last):
+            raise ValueError('season '+name+' starts on '+str(first)+' after it ends on '+str(last)+' (snow years run from August 1 to July 31)')
+      counts = [SCD_between(snow_year_date(year, first), snow_year_date(year, last)) for year in range(year_min, year_max)]
+      fields.append(np.mean(counts, axis=0))
+
+   lat, lon = load_latlon()
+   if fields[0].shape != lon.shape: #index built from files written with CROP_DOMAIN
+      lat, lon = crop_to_domain(lat), crop_to_domain(lon)
+
+   data = xr.Dataset(
+      {'snowc': (('season', 'yc', 'xc'), np.stack(fields))},
+      coords={'season': list(seasons), 'latitude': (('yc', 'xc'), lat), 'longitude': (('yc', 'xc'), lon)})
+   return data
@@ -0,0 +1,92 @@
+## Created: Oct 18, 2026
+## Last edited: Oct 18, 2026
+
+import os
+import numpy as np
+import xarray as xr
+from netCDF4 import Dataset
+from datetime import datetime
+
+from utils.constants import IMS_files_loc
+from utils.group_IMS_year import ROW_BLOCK
+
+DATE_VARIABLES = ['first_snow', 'snow_off', 'longest_run']
+
+def snow_year_block(year, rows):
+   '''
+   Returns snowc for rows of the grid over the snow year (August, year)-(July, year+1),
+   as a uint8 array (time, rows, xc) read from the two yearly files. Days not stored
+   yet (current year) are left out, and so is the second year if its file is not 
+   there yet. Raises FileNotFoundError if the file of the first year is missing.
+   '''
+   aug_1 = datetime(year, 8, 1).timetuple().tm_yday
+   jul_31 = datetime(year+1, 7, 31).timetuple().tm_yday
+   first = IMS_files_loc+'IMS_snowc_'+str(year)+'.nc'
+   if not os.path.exists(first):
+      raise FileNotFoundError('no IMS data for snow year '+str(year)+'-'+str(year+1)+': '+first+' does not exist')
+
+   parts = []
+   for y, days in [(year, slice(aug_1-1, None)), (year+1, slice(0, jul_31))]:
+      fname = IMS_files_loc+'IMS_snowc_'+str(y)+'.nc'
+      if os.path.exists(fname):
+         with Dataset(fname, 'r') as f:
+            f.set_auto_mask(False) #keep uint8, no data is not snow
+            parts.append(f.variables['snowc'][days, rows, :])
+   return np.concatenate(parts, axis=0)
+
+def snow_dates(snow):
+   '''
+   Returns first snow day, snow-off day and longest run of consecutive snow days
+   for every grid square, given a boolean snow cube (time, yc, xc). Days are
+   counted from 1 on the first time step; the snow-off day is the first day after
+   the last day with snow. Grid squares that never have snow get NaN dates and a
+   run of 0. Days with no data count as days without snow.
+   '''
+   ndays = snow.shape[0]
+   has_snow = snow.any(axis=0)
+
+   first_snow = np.argmax(snow, axis=0) + 1.
+   snow_off = ndays - np.argmax(snow[::-1], axis=0) + 1.
+   first_snow[~has_snow] = np.nan
+   snow_off[~has_snow] = np.nan
+
+   run = np.zeros(snow.shape[1:], dtype=np.int16)
+   longest_run = np.zeros(snow.shape[1:], dtype=np.int16)
+   for day in range(ndays): #one 2D step per day, run restarts at 0 on days without snow
+      run = (run + 1) * snow[day]
+      np.maximum(longest_run, run, out=longest_run)
+
+   return first_snow, snow_off, longest_run
+
+def snow_year_dates(year):
+   '''
+   Returns snow onset and melt products for the snow year (August, year)-(July, year+1):
+   first_snow, snow_off (days since July 31 of year, i.e. August 1 is day 1) and
+   longest_run (days). The yearly files are read ROW_BLOCK rows at a time, so
+   memory use stays at one block of the snow year.
+
+   Returns:
+      xarray Dataset with variables first_snow, snow_off and longest_run (yc, xc).
+   '''
+   with Dataset(IMS_files_loc+'IMS_snowc_'+str(year)+'.nc', 'r') as f:
+      ny, nx = f.variables['snowc'].shape[1:]
+      lat = f.variables['latitude'][:]
+      lon = f.variables['longitude'][:]
+
+   fields = {var: np.full((ny, nx), np.nan) for var in DATE_VARIABLES}
+   for row in range(0, ny, ROW_BLOCK):
+      rows = slice(row, row+ROW_BLOCK)
+      block_fields = snow_dates(snow_year_block(year, rows) == 4)
+      for var, values in zip(DATE_VARIABLES, block_fields):
+         fields[var][rows, :] = values
+
+   data = xr.Dataset(
+      {var: (('yc', 'xc'), fields[var]) for var in DATE_VARIABLES},
+      coords={'latitude': (('yc', 'xc'), lat), 'longitude': (('yc', 'xc'), lon)})
+   #not CF time units (no reference year), so xarray leaves them as numbers
+   data.first_snow.attrs['long_name'] = 'first day with snow, day of snow year (August 1 is day 1)'
+   data.snow_off.attrs['long_name'] = 'first day after the last day with snow, day of snow year (August 1 is day 1)'
+   data.longest_run.attrs['long_name'] = 'longest run of consecutive days with snow'
+   for var in DATE_VARIABLES:
+      data[var].attrs['units'] = 'days'
+   return data
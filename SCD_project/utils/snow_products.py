@@ -0,0 +1,73 @@
+## Created: Oct 18, 2026
+## Last edited: Oct 18, 2026
+
+import numpy as np
+import xarray as xr
+from netCDF4 import Dataset
+
+from utils.constants import IMS_files_loc
+from utils.snow_dates import snow_year_block
+from utils.group_IMS_year import SNOWC_NO_DATA, ROW_BLOCK
+
+#seasonal products counted in one pass over the daily data: variable name -> (IMS values counted, description)
+#IMS values: 0 outside the hemisphere, 1 sea, 2 land without snow, 3 sea ice, 4 snow covered land
+PRODUCTS = {
+   'snowc': ([4], 'count of days with snow covered land'),
+   'sea_ice': ([3], 'count of days with sea ice'),
+   'snow_free': ([2], 'count of days with land without snow'),
+}
+
+#the snow year starts on August 1, the spring season ('MAM') on February 1, 184 days later
+SEASON_SPLIT = 184
+
+def count_block(block, values):
+   '''
+   Returns the count of days with any of values for every grid square of a block
+   (time, rows, xc).
+   '''
+   counts = np.zeros(block.shape[1:], dtype=np.int16)
+   for value in values:
+      counts += np.count_nonzero(block == value, axis=0).astype(np.int16)
+   return counts
+
+def snow_year_products(year, products=list(PRODUCTS)):
+   '''
+   Returns the seasonal products for the snow year (August, year)-(July, year+1),
+   reading the daily snow cover once, ROW_BLOCK rows at a time, whatever the number
+   of products. Seasons are the 6-month periods Aug-Jan (labelled 'SON') and Feb-Jul
+   (labelled 'MAM'), as in SCD_anomaly.calc_seasonal_SCD, so product snowc
+   is the same SCD.
+
+   Args:
+      year (int): first calendar year of the snow year.
+      products (list of str): keys of PRODUCTS to count.
+
+   Returns:
+      xarray Dataset with one variable (season, yc, xc) per product, and the count
+      of days with IMS data in variable valid_days (season, yc, xc).
+   '''
+   with Dataset(IMS_files_loc+'IMS_snowc_'+str(year)+'.nc', 'r') as f:
+      ny, nx = f.variables['snowc'].shape[1:]
+      lat = f.variables['latitude'][:]
+      lon = f.variables['longitude'][:]
+
+   fields = {product: np.zeros((2, ny, nx), dtype=np.int16) for product in products}
+   valid_days = np.zeros((2, ny, nx), dtype=np.int16)
+   for row in range(0, ny, ROW_BLOCK):
+      block = snow_year_block(year, slice(row, row+ROW_BLOCK)) #(time, rows, xc)
+      valid = block != SNOWC_NO_DATA
+      valid_days[0, row:row+ROW_BLOCK, :] = np.count_nonzero(valid[SEASON_SPLIT:], axis=0)
+      valid_days[1, row:row+ROW_BLOCK, :] = np.count_nonzero(valid[:SEASON_SPLIT], axis=0)
+      for product in products:
+         values = PRODUCTS[product][0]
+         fields[product][0, row:row+ROW_BLOCK, :] = count_block(block[SEASON_SPLIT:], values)
+         fields[product][1, row:row+ROW_BLOCK, :] = count_block(block[:SEASON_SPLIT], values)
+
+   data = xr.Dataset(
+      {product: (('season', 'yc', 'xc'), fields[product]) for product in products},
+      coords={'season': ['MAM', 'SON'], 'latitude': (('yc', 'xc'), lat), 'longitude': (('yc', 'xc'), lon)})
+   data['valid_days'] = (('season', 'yc', 'xc'), valid_days)
+   for product in products:
+      data[product].attrs['long_name'] = PRODUCTS[product][1]
+      data[product].attrs['units'] = 'days'
+   return data
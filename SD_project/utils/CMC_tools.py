@@ -1,19 +1,95 @@
 ## Author: Aleksandra Elias Chereque
 ## Created: July 14, 2020
-## Last edited: Sept 2, 2020
+## Last edited: Oct 18, 2026
 
+import io
 import os
 import zipfile
+import hashlib
 import numpy as np
 
-from utils.constants import CMC_DIR
+from utils.constants import CMC_DIR, CACHE_GRIDS
+
+GRID_CACHE_DIR = CMC_DIR+'grid_cache/'
+#parsed masks and lat/lon grids are saved here as NAME.npz, see cached_grids
+
+_grids = {} #name -> tuple of arrays, filled by cached_grids
+
+def snow_year_slice(year_min, year_max):
+   '''
+   Returns the time slice from August of year_min to July of year_max (inclusive), for selecting with xarray's sel. 
+   '''
+   return slice(str(year_min)+'-08-01', str(year_max)+'-07-31')
+
+def file_hash(path):
+   '''
+   Returns the SHA-1 hash of the content of file path.
+   '''
+   sha1 = hashlib.sha1()
+   with open(path, 'rb') as f:
+      for block in iter(lambda: f.read(1 << 20), b''):
+         sha1.update(block)
+   return sha1.hexdigest()
+
+def cached_grids(name, source, parse):
+   '''
+   Returns the arrays parsed from a static CMC file, parsing it at most once: the arrays 
+   are kept for the rest of the process, and if CACHE_GRIDS is set in utils/constants.py, 
+   saved to GRID_CACHE_DIR/name.npz with the modification time and hash of the file. 
+   The saved arrays are used while the file has the same modification time, or the same 
+   hash if it was modified (e.g. downloaded again). The arrays are shared, so they are read-only.
+
+   Args:
+      name (str): name of the arrays, e.g. 'lsmask'.
+      source (str): full path to the file they are parsed from.
+      parse (function): parses the file, returns a tuple of arrays.
+
+   Returns:
+      tuple of arrays.
+   '''
+
+   if name in _grids:
+      return _grids[name]
+
+   fname = GRID_CACHE_DIR+name+'.npz'
+   mtime = os.stat(source).st_mtime_ns
+   grids = None
+
+   if CACHE_GRIDS and os.path.exists(fname):
+      with np.load(fname) as saved:
+         saved_grids = tuple(saved['grid_'+str(i)] for i in range(int(saved['count'])))
+         saved_mtime, saved_hash = int(saved['mtime']), str(saved['sha1'])
+      if saved_mtime == mtime:
+         grids = saved_grids
+      elif saved_hash == file_hash(source): #same content, keep the new mtime so the hash is not needed next time
+         grids = saved_grids
+         np.savez(fname, mtime=mtime, sha1=saved_hash, count=len(grids), **{'grid_'+str(i): grid for i, grid in enumerate(grids)})
+
+   if grids is None:
+      grids = tuple(parse())
+      if CACHE_GRIDS:
+         if not os.path.exists(GRID_CACHE_DIR):
+            os.makedirs(GRID_CACHE_DIR)
+         np.savez(fname, mtime=mtime, sha1=file_hash(source), count=len(grids), **{'grid_'+str(i): grid for i, grid in enumerate(grids)})
+
+   for grid in grids:
+      grid.flags.writeable = False
+   _grids[name] = grids
+   return grids
 
 def read_lsmask():
    '''
    Returns an array, functioning as a land-sea mask. Values of 1 on land and 0 on water, on CMC snow depth analysis lat-lon grid. 
+   Parsed at most once, see cached_grids.
    '''
 
    fname = CMC_DIR+'cmc_analysis_lsmask_binary_nogl_v01.2.txt'
+   return cached_grids('lsmask', fname, lambda: parse_lsmask(fname))[0]
+
+def parse_lsmask(fname):
+   '''
+   Parses the land-sea mask file, see read_lsmask.
+   '''
 
    with open(fname, 'rt') as f:
       file_content = f.read().splitlines()
@@ -24,37 +100,45 @@ def read_lsmask():
 
    mask = np.transpose(mask)
 
-   return mask   
+   return (mask,)
 
 def read_homog_mask(return_latlon=False):
    '''
    Returns a mask with value 0 on every grid square that needs to be excluded, 1 on good grid squares. 
 
+   Parsed at most once, see cached_grids.
+
    Args:
       return_latlon (bool): in case lat/lon grids are needed, set True. Default is False.
    '''
 
    fname = CMC_DIR + 'cmc_homog_mask_points_v01.2.csv'
+   lat, lon, mask = cached_grids('homog_mask', fname, lambda: parse_homog_mask(fname))
+
+   if return_latlon:
+      return lat, lon, mask
+   else:
+      return mask
+
+def parse_homog_mask(fname):
+   '''
+   Parses the homogeneity mask file, see read_homog_mask. Returns lat, lon, mask.
+   '''
+
+   i, j, latitude, longitude = np.loadtxt(fname, skiprows=1, delimiter=',', unpack=True)
+   i = i.astype(int) - 1 #Python convention
+   j = j.astype(int) - 1 #Python convention
 
-   homog_mask_points = np.loadtxt(fname, skiprows=1, delimiter=',')
    lat = np.zeros((706, 706))
    lon = np.zeros((706, 706))
-
-   for row in range(np.shape(homog_mask_points)[0]):
-      i, j, latitude, longitude = homog_mask_points[row]
-      j = j-1 #Python convention
-      i = i-1 #Python convention
-      lat[int(i),int(j)] = latitude
-      lon[int(i), int(j)] = longitude
+   lat[i, j] = latitude
+   lon[i, j] = longitude
 
    mask = np.where(lat == 0, 1., 0.) 
 
    lat, lon, mask = np.transpose(lat), np.transpose(lon), np.transpose(mask)
 
-   if return_latlon:
-      return lat, lon, mask
-   else:
-      return mask
+   return lat, lon, mask
 
 def read_mly_data(dir, zipname, months = 12):
    '''
@@ -64,38 +148,53 @@ def read_mly_data(dir, zipname, months = 12):
       dir (str): full path to the directory where the file has been downloaded
       zipname (str): the filename ending in .zip
       months (int): default 12 for 12 months of data, but 1998 has only 5 months and the current year may also be incomplete.
+
+   Returns:
+      array (months, 706, 706) of float32 monthly snow depth.
    '''
 
    with zipfile.ZipFile(dir+zipname) as z:
       fname = z.namelist()[0] #there is only one file in these .zip files
-      data = np.zeros((months, 706, 706))
       with z.open(fname, 'r') as f:
-         file_content = f.read().splitlines()
-         for month in range(months):
-            first = month * (706 + 1) #files are formatted as 'YYYY MM \n (706,706) data, so skip the first line, and then every 706th line after that
-            for row in range(1, 707):
-               content = file_content[first + row].split()
-               data[month, row-1, :] = [float(i) for i in content]
-            data[month,:,:] = np.transpose(data[month,:,:])
+         #files are formatted as 'YYYY MM \n (706,706) data' for each month, so skip the first line, and then every 706th line after that
+         rows = (line for i, line in enumerate(io.TextIOWrapper(f)) if i % (706 + 1) != 0)
+         #parsed in one call as lines are decompressed, as float64 then cast, so values are rounded as before
+         values = np.loadtxt(rows, dtype=np.float64, max_rows=months*706)
+
+   if values.shape != (months*706, 706):
+      raise ValueError(zipname+' holds fewer than '+str(months)+' months of data')
+
+   data = np.reshape(values, (months, 706, 706)).astype(np.float32)
+   data = np.transpose(data, (0, 2, 1)) #rows of the file are columns of the grid
 
    return data
 
 def load_latlon():
+   '''
+   Returns latitude and longitude grids of the CMC snow depth analysis. Parsed at most once, see cached_grids.
+   '''
    path = CMC_DIR + 'cmc_analysis_ps_lat_lon_v01.2.zip'
-   
+   if not os.path.exists(path): #only the extracted file is there
+      path = CMC_DIR+'cmc_analysis_ps_lat_lon_v01.2.txt'
+
+   return cached_grids('latlon', path, parse_latlon)
+
+def parse_latlon():
+   '''
+   Parses the lat/lon file, extracting it from its zip file if needed, see load_latlon.
+   '''
    if not os.path.exists(CMC_DIR+'cmc_analysis_ps_lat_lon_v01.2.txt'):
       with zipfile.ZipFile(CMC_DIR+'cmc_analysis_ps_lat_lon_v01.2.zip','r') as zip_ref:
          zip_ref.extractall(CMC_DIR)
 
    i, j, lat, lon = np.loadtxt(CMC_DIR+'cmc_analysis_ps_lat_lon_v01.2.txt', skiprows=9, unpack=True)
 
-   lats, lons = np.zeros((706, 706)), np.zeros((706, 706))
+   i = i.astype(int) - 1 #Python convention
+   j = j.astype(int) - 1 #Python convention
 
-   for idx in range(len(i)):
-      i_idx = int(i[idx]) - 1 #Python convention
-      j_idx = int(j[idx]) - 1 #Python convention
-      lats[i_idx, j_idx] = lat[idx]
-      lons[i_idx, j_idx] = lon[idx]
+   lats, lons = np.zeros((706, 706)), np.zeros((706, 706))
+   lats[i, j] = lat
+   lons[i, j] = lon
 
    lats, lons = np.transpose(lats), np.transpose(lons)
 
@@ -0,0 +1,81 @@
+## Created: Oct 18, 2026
+## Last edited: Oct 18, 2026
+
+import os
+import numpy as np
+import xarray as xr
+
+from utils.constants import CMC_DIR, CMC_files_loc, current_y
+from utils.CMC_tools import load_latlon
+
+#attributes of sdp in the yearly files, see group_CMC_year.write_CMC_year
+SDP_ATTRS = {'units': 'cm', 'valid_min': np.float32(0.), 'short_name': 'sdp', 'standard_name': 'surface_snow_thickness', 'grid_mapping': 'latitude_longitude'}
+
+def ECCC_fname(year, month):
+   return CMC_DIR+str(year)+'%02d'%month+'_snow_ps24km60N.nc'
+
+def ECCC_months(year):
+   '''
+   Returns the months of year (1=Jan) that have an ECCC monthly file in CMC_DIR.
+   '''
+   return [month for month in range(1, 13) if os.path.exists(ECCC_fname(year, month))]
+
+def year_sources(year):
+   '''
+   Returns the files the snow depth of year is read from: the ECCC monthly files for current_y
+   if there are any (see open_year), otherwise CMC_sdp_mly_YYYY.nc in CMC_files_loc.
+   '''
+   months = ECCC_months(year) if year == current_y else []
+   if months:
+      return [ECCC_fname(year, month) for month in months]
+   return [CMC_files_loc+'CMC_sdp_mly_'+str(year)+'.nc']
+
+def open_ECCC_year(year):
+   '''
+   Returns a lazily opened view of the ECCC monthly files of year, in the same form as the yearly
+   files (variable sdp (time, yc, xc), latitude/longitude coordinates, first day of each month as
+   time), without copying the data. A new monthly file is part of the view as soon as it is in CMC_DIR.
+
+   Returns:
+      xarray Dataset.
+   '''
+   lat_vals, lon_vals = load_latlon()
+   months = ECCC_months(year)
+   files = [xr.open_dataset(ECCC_fname(year, month), chunks={}) for month in months]
+
+   fields = []
+   for month, f in zip(months, files):
+      snd = f['snd'].squeeze(drop=True) #(y, x), any single time step dropped
+      snd = snd.drop_vars(list(snd.coords)) #the grid coordinates of the yearly files are used instead
+      snd = snd.rename(dict(zip(snd.dims, ('yc', 'xc')))) #the grid is stored as in the yearly files, see group_CMC_year.read_ECCC_months
+      fields.append(snd.astype(np.float32).expand_dims(time=[np.datetime64('%d-%02d-01'%(year, month), 'ns')]))
+
+   sdp = xr.concat(fields, dim='time')
+   sdp.attrs = dict(SDP_ATTRS)
+   data = xr.Dataset({'sdp': sdp, 'latitude_longitude': np.int32(0)},
+      coords={'latitude': (('yc', 'xc'), lat_vals.astype(np.float32), {'units': 'degrees_north', 'standard_name': 'latitude'}),
+              'longitude': (('yc', 'xc'), lon_vals.astype(np.float32), {'units': 'degrees_east', 'standard_name': 'longitude'})})
+   data.set_close(lambda: [f.close() for f in files])
+   return data
+
+def open_year(year):
+   '''
+   Returns the monthly snow depth of year, lazily opened: the view of the ECCC monthly files for
+   current_y if there are any (see open_ECCC_year), otherwise CMC_sdp_mly_YYYY.nc in CMC_files_loc.
+
+   Returns:
+      xarray Dataset with variable sdp (time, yc, xc).
+   '''
+   if year == current_y and ECCC_months(year):
+      return open_ECCC_year(year)
+   return xr.open_dataset(CMC_files_loc+'CMC_sdp_mly_'+str(year)+'.nc', chunks={})
+
+def open_years(years):
+   '''
+   Returns the monthly snow depth of years as one lazily opened dataset, see open_year. Only variables
+   with a time dimension are concatenated, lat/lon are taken from the first year.
+   '''
+   datasets = [open_year(year) for year in years]
+   data = xr.combine_by_coords(datasets, data_vars='minimal', coords='minimal', compat='override', combine_attrs='override')
+   data.set_close(lambda: [dataset.close() for dataset in datasets])
+   return data
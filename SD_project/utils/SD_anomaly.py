@@ -0,0 +1,211 @@
+## Created: Oct 18, 2026
+## Last edited: Oct 18, 2026
+
+import os
+import xarray as xr
+import dask
+from pathlib import Path
+from itertools import product
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.constants import CMC_DIR, CMC_files_loc, N_WORKERS, CACHE_CLIM
+from utils.CMC_tools import read_lsmask, read_homog_mask, snow_year_slice
+from utils.CMC_view import open_year, open_years, year_sources
+
+#the snow depth calculations of SD_calc.py, kept out of the script so worker processes can import them
+
+plot_root = Path(__file__).absolute().parent.parent #absolute path to SD_project directory
+data_root = plot_root.parent / 'data' #directory for final versions of data, used to plot
+
+month_names = {'1':'Jan', '2':'Feb', '3':'March', '4':'April', '5':'May', '6': 'June', '7':'July','8':'Aug', '9':'Sept', '10': 'Oct', '11':'Nov', '12':'Dec'}
+
+def load_years(year_min, year_max):
+   '''
+   Loads snow depth data that falls between Aug of year_min and July of year_max. Months of the current year are read straight from the ECCC monthly files (see utils/CMC_view.py).
+
+   Returns:
+      xarray Dataset containing monthly snow depth data.
+   '''
+   
+   # Only variables with a time dimension are concatenated, lat/lon are taken from the first file
+   data = open_years(range(year_min, year_max + 1))
+   
+   # Selects August of year_min to July of year_max as one contiguous slice of the sorted time axis
+   data = data.sel(time=snow_year_slice(year_min, year_max))
+   return data
+
+def calc_mly_clim(data):
+   '''
+   Returns monthly climatology in xarray Dataset or DataArray (same as input), given data for a period of time. Can be applied to daily data or monthly data, and dates are converted to months. E.g. Coordinate time with value '01-01-2000' will be replaced with coordinate month and value '1'.
+   '''
+
+   data = data.groupby('time.month').mean(dim='time')
+   return data
+
+def clim_for_month_of_interest(data, month):
+   '''
+   Calculates monthly climatology using data and selects a particular month. No time coordinate will persist. Returns xarray Dataset or DataArray, same as input.
+   '''
+
+   data = calc_mly_clim(data)
+   return select_month(data, month)
+
+def select_month(data, month):
+   '''
+   Selects a particular month from monthly climatology (see calc_mly_clim). No month coordinate will persist.
+   '''
+
+   return data.sel(month=month)
+
+def lsmask_data(data):
+   mask = read_lsmask()
+   return data.where(mask == 1)
+
+def homog_mask_data(data):
+   mask = read_homog_mask()
+   return data.where(mask == 1)
+
+mly_clims = {} #(year_min, year_max) -> monthly climatology, filled by mly_climatology
+
+def clim_stamp(year_min, year_max):
+   '''
+   Returns a string identifying the versions of the yearly files and masks that the climatology for (Aug, year_min)-(July, year_max) is calculated from, using their size and modification time.
+   '''
+
+   fnames = [fname for year in range(year_min, year_max + 1) for fname in year_sources(year)]
+   fnames += [CMC_DIR+'cmc_analysis_lsmask_binary_nogl_v01.2.txt', CMC_DIR+'cmc_homog_mask_points_v01.2.csv']
+   stamp = []
+   for fname in fnames:
+      st = os.stat(fname)
+      stamp.append(os.path.basename(fname)+':'+str(st.st_size)+':'+str(st.st_mtime_ns))
+   return ';'.join(stamp)
+
+def mly_climatology(year_min, year_max):
+   '''
+   Returns the climatological snow depth of all 12 months for data between (Aug, year_min) and (July, year_max), with the land-sea and homogeneity masks applied. It is calculated once per run for each pair of years, so any month can then be selected with select_month. If CACHE_CLIM is set in utils/constants.py, it is also saved to CMC_files_loc and read back in later runs while the yearly files and masks are unchanged.
+
+   Returns:
+      xarray DataArray (month, yc, xc) of snow depth.
+   '''
+
+   if (year_min, year_max) in mly_clims:
+      return mly_clims[(year_min, year_max)]
+
+   fname = CMC_files_loc+'CMC_sdp_clim_'+str(year_min)+'_'+str(year_max)+'.nc'
+   stamp = clim_stamp(year_min, year_max)
+   mly_clim = None
+
+   if CACHE_CLIM and os.path.exists(fname):
+      with xr.open_dataset(fname) as saved:
+         if saved.attrs.get('source_stamp') == stamp:
+            mly_clim = saved['sdp'].load()
+
+   if mly_clim is None:
+      data = load_years(year_min, year_max) #load (Aug, year_min)-(July, year_max)
+      mly_clim = calc_mly_clim(data['sdp'])
+      mly_clim = lsmask_data(mly_clim) #apply CMC lsmask to exclude ocean, Greenland
+      mly_clim = homog_mask_data(mly_clim).load() #apply homogeneity mask
+      if CACHE_CLIM:
+         saved = mly_clim.to_dataset()
+         saved.attrs['source_stamp'] = stamp
+         saved.to_netcdf(fname)
+
+   mly_clims[(year_min, year_max)] = mly_clim
+   return mly_clim
+
+# Functions with outputs
+
+def calculate_clim(month, year_min, year_max, save = False, mly_clim = None):
+   '''
+   Calculates the climatological snow depth for month using the years given. E.g. calculate_clim(2008, 2019, 2) will return the climatological snow depth using Feb 2009, Feb 2008, ..., Feb 2019. E.g. calculate_clim(2008, 2019, 10) will return the climatological snow depth using Oct 2008, Oct 2009, ..., Oct 2018.
+
+   Args:
+      month (int): value between 1 and 12, indicating which month to calculate for. E.g. 1 is January.
+      year_min (int): months after and including August of year_min will be used to calculate climatology.
+      year_max (int): months before and including July of year_max will be used to calculate the climatology.
+      save (bool): True if climatology should be saved to NetCDF file, default False
+      mly_clim (xarray DataArray): monthly climatology for these years (see mly_climatology), taken from mly_climatology if None
+
+   '''
+
+   if mly_clim is None:
+      mly_clim = mly_climatology(year_min, year_max) #(Aug, year_min)-(July, year_max), masks applied
+   select_data = select_month(mly_clim, month)
+
+   if save:
+      print('saving climatology')
+      select_data.to_netcdf(str(data_root) +'/'+ month_names[str(month)]+'_clim_'+str(year_min)+'_'+str(year_max)+'.nc')
+
+def calculate_anom(month, year_of_interest, clim_years_min, clim_years_max, save = False, mly_clim = None):
+   '''
+   Calculate the snow depth anomaly for month in the year given. Climatology is calculated using data between (Aug, clim_years_min)-(July, clim_years_max). 
+
+   Args:
+      month (int): value between 1 and 12 to choose month of interest.
+      year_of_interest (int): year of interest. E.g. if looking at Feb 2019 against climatology, use month = 2 and year = 2019.
+      clim_years_min (int): months after and including August of year_min will be used to calculate climatology.
+      clim_years_max (int): months before and including July of year_max will be used to calculate the climatology.
+      save (bool): True if anomaly should be saved to NetCDF file, default False
+      mly_clim (xarray DataArray): monthly climatology for the climatology years (see mly_climatology), taken from mly_climatology if None
+   '''   
+
+   if mly_clim is None:
+      mly_clim = mly_climatology(clim_years_min, clim_years_max) #(Aug, clim_year_min)-(July, clim_year_max), masks applied
+   clim_for_month = select_month(mly_clim, month)
+   clim_for_month = clim_for_month.where(clim_for_month > 1e-5) #mask out very small values to avoid dividing by zero later
+
+   specific_data = open_year(year_of_interest)
+   specific_data_mly = calc_mly_clim(specific_data['sdp'])
+   select = select_month(specific_data_mly, month)
+
+   #key calculation
+   percent_anom = ((select - clim_for_month) / clim_for_month) * 100 
+
+   #masking
+   masked_anom = lsmask_data(percent_anom) #mask out ocean and Greenland
+   masked_anom = homog_mask_data(masked_anom) #apply homogeneity mask
+ 
+   if save:
+      print('saving anomaly field')
+      masked_anom.to_netcdf(str(data_root)+'/anom_SD_'+month_names[str(month)]+str(year_of_interest)+'_clim_'+str(clim_years_min)+'_'+str(clim_years_max)+'.nc')
+
+def init_batch(mly_clim, clim_years_min, clim_years_max):
+   '''
+   Keeps the monthly climatology in each worker process of batch_anom, so it is sent once per worker.
+   Only run in the worker processes, as it sets the dask scheduler of the whole process.
+   '''
+   global batch_clim
+   batch_clim = (mly_clim, clim_years_min, clim_years_max)
+   dask.config.set(scheduler='synchronous') #dask's thread pool does not survive the fork, and each process is already one task at a time
+
+def batch_month_anom(month_year):
+   month, year = month_year
+   mly_clim, clim_years_min, clim_years_max = batch_clim
+   calculate_anom(month, year, clim_years_min, clim_years_max, save=True, mly_clim=mly_clim)
+   return month_year
+
+def batch_anom(months, years, clim_years_min, clim_years_max, workers = N_WORKERS):
+   '''
+   Saves the climatology for each of months and the anomaly for each of months in each of years, loading and averaging the climatology years once.
+
+   Args:
+      months (list of int): months of interest, 1=Jan.
+      years (list of int): years of interest.
+      clim_years_min (int): months after and including August of clim_years_min will be used to calculate climatology.
+      clim_years_max (int): months before and including July of clim_years_max will be used to calculate the climatology.
+      workers (int): number of worker processes for the anomalies, 1 does one at a time.
+   '''
+
+   mly_clim = mly_climatology(clim_years_min, clim_years_max)
+   for month in months:
+      calculate_clim(month, clim_years_min, clim_years_max, save=True, mly_clim=mly_clim)
+
+   pairs = list(product(months, years))
+   if workers > 1:
+      with ProcessPoolExecutor(max_workers=workers, initializer=init_batch, initargs=(mly_clim, clim_years_min, clim_years_max)) as pool:
+         for month, year in pool.map(batch_month_anom, pairs):
+            print('done anomaly for '+month_names[str(month)]+' '+str(year))
+   else: #in this process, so dask keeps its thread pool
+      for month, year in pairs:
+         calculate_anom(month, year, clim_years_min, clim_years_max, save=True, mly_clim=mly_clim)
+         print('done anomaly for '+month_names[str(month)]+' '+str(year))
@@ -3,6 +3,12 @@ RUN_SETUP = True #if true, creates the yearly NetCDF files
 
 current_y = 2020 
 
+FTP_WORKERS = 4 #number of concurrent FTP connections used to download CMC files
+N_WORKERS = 1 #number of processes used in batch mode of SD_calc.py, 1 runs one month/year at a time
+SETUP_WORKERS = 2 #number of processes building the yearly NetCDF files, each holds a year of the grid in memory, 1 builds one year at a time
+CACHE_CLIM = True #if true, monthly climatologies are saved in CMC_files_loc and reused while the yearly files are unchanged
+CACHE_GRIDS = True #if true, parsed masks and lat/lon grids are saved in CMC_DIR/grid_cache/ and reused while the source files are unchanged
+
 CMC_DIR = '/data/kushner_group/CMC_SD/'
 #set path to directory where snow depth data should be downloaded
 
@@ -0,0 +1,246 @@
+## Created: Oct 18, 2026
+## Last edited: Oct 18, 2026
+
+#FTP helpers used by utils/fetch_data.py. SCD_project and SD_project each keep a copy of this
+#file so that each project runs on its own, keep the two copies the same
+
+import os
+import json
+import time
+import calendar
+import threading
+import ftplib
+from ftplib import FTP
+from concurrent.futures import ThreadPoolExecutor
+
+HOST = 'sidads.colorado.edu'
+PORT = 21
+
+RETRIES = 4 #attempts per file before giving up
+BACKOFF = 2 #seconds to wait after the first failed attempt, doubled after each one
+
+def connect(path, host=None, port=None):
+   '''
+   Returns an FTP instance logged in anonymously to host (default HOST) and pointing to directory path.
+   '''
+
+   ftp = FTP()
+   ftp.connect(host or HOST, port or PORT)
+   ftp.login()
+   ftp.cwd(path)
+   return ftp
+
+def download(ftp, download_dir, fname, size=None, modified=None):
+   '''
+   Retrieve file in binary transfer mode, write to file locally. The transfer goes to
+   fname.part first, which is resumed from where it stopped (REST) if the download is
+   interrupted, and renamed to fname once complete. The remote modification time is
+   kept in fname.part.modified, and the transfer starts over if the remote file has
+   changed since the part was downloaded.
+
+   Args:
+      ftp: relevant instance of FTP class, pointing to correct directory
+      download_dir (str): path to directory to save these files locally
+      fname: filename accessed via FTP, used to name file locally
+      size (int): remote size in bytes, if known, checked once the transfer ends
+      modified (float): remote modification time (seconds since epoch), if known, given to the local file
+   '''
+
+   os.makedirs(download_dir, exist_ok=True) #several threads may create it at once
+
+   local_filename = download_dir+str(fname)
+   part_filename = local_filename+'.part'
+   stamp_filename = part_filename+'.modified'
+   offset = os.path.getsize(part_filename) if os.path.exists(part_filename) else 0
+   if size is not None and offset > size: #left from an older version of the file
+      offset = 0
+   if offset and modified is not None:
+      stamp = None
+      if os.path.exists(stamp_filename):
+         with open(stamp_filename, 'r') as f:
+            stamp = f.read().strip()
+      if stamp != str(int(modified)): #the remote file changed since the part was downloaded
+         offset = 0
+
+   if modified is not None and not offset:
+      with open(stamp_filename, 'w') as f:
+         f.write(str(int(modified)))
+
+   with open(part_filename, 'ab' if offset else 'wb') as lf:
+      ftp.retrbinary('RETR ' + fname, lf.write, rest=offset if offset else None)
+
+   if size is not None and os.path.getsize(part_filename) != size:
+      os.remove(part_filename)
+      raise OSError('size of downloaded '+fname+' does not match the remote file')
+
+   os.replace(part_filename, local_filename)
+   if os.path.exists(stamp_filename):
+      os.remove(stamp_filename)
+   if modified is not None:
+      os.utime(local_filename, (modified, modified))
+
+def parse_time(value):
+   '''
+   Returns the FTP timestamp value (YYYYMMDDHHMMSS, UTC, as given by MLSD and MDTM) in seconds since epoch.
+   '''
+
+   return calendar.timegm(time.strptime(value[:14], '%Y%m%d%H%M%S'))
+
+def remote_files(ftp):
+   '''
+   Returns {filename: (size, modified)} for the files in the current directory of ftp,
+   with size in bytes and modification time in seconds since epoch (None if the server
+   does not give it). Uses MLSD, or LIST then SIZE and MDTM for each file if the server
+   does not support MLSD.
+   '''
+
+   files = {}
+   try:
+      for name, facts in ftp.mlsd(facts=['type', 'size', 'modify']):
+         if facts.get('type') == 'file':
+            modified = parse_time(facts['modify']) if 'modify' in facts else None
+            files[name] = (int(facts['size']), modified)
+   except ftplib.error_perm: #MLSD not supported
+      listing = []
+      ftp.retrlines('LIST', listing.append)
+      ftp.voidcmd('TYPE I') #SIZE gives the size in bytes in binary mode
+      for line in listing:
+         words = line.split(None, 8)
+         if line.startswith('d') or len(words) < 9: #skip directories, including '.' and '..'
+            continue
+         name = words[-1].lstrip()
+         try:
+            size = ftp.size(name)
+         except ftplib.error_perm: #SIZE not supported, the size in the listing is used
+            size = int(words[4])
+         try:
+            modified = parse_time(ftp.voidcmd('MDTM '+name)[4:].strip())
+         except ftplib.error_perm: #MDTM not supported
+            modified = None
+         files[name] = (size, modified)
+   return files
+
+def up_to_date(local_filename, size, modified):
+   '''
+   Returns True if local_filename exists with the size and modification time of the remote file.
+   '''
+
+   if not os.path.exists(local_filename):
+      return False
+   st = os.stat(local_filename)
+   return st.st_size == size and (modified is None or int(st.st_mtime) == modified)
+
+def read_manifest(manifest):
+   '''
+   Returns {filename: (size, modified)} saved in manifest by write_manifest, empty if there is none.
+   '''
+
+   if manifest is None or not os.path.exists(manifest):
+      return {}
+   with open(manifest, 'r') as f:
+      return {name: tuple(entry) for name, entry in json.load(f).items()}
+
+def write_manifest(manifest, files):
+   '''
+   Saves files {filename: (size, modified)} to manifest, replacing it in one step so that an interrupted write leaves the old one.
+   '''
+
+   with open(manifest+'.tmp', 'w') as f:
+      json.dump(files, f)
+   os.replace(manifest+'.tmp', manifest)
+
+def record_manifest(manifest, files):
+   '''
+   Adds files {filename: (size, modified)}, as returned by sync_files, to manifest once they
+   have been used, so that the next sync_files no longer returns them.
+   '''
+
+   recorded = read_manifest(manifest)
+   recorded.update(files)
+   write_manifest(manifest, recorded)
+
+def sync_files(path, download_dir, select=None, workers=1, host=None, port=None, manifest=None):
+   '''
+   Downloads the files in remote directory path that are missing or out of date in
+   download_dir, over a pool of FTP connections that are each reused for many files.
+   Files whose local size and modification time match the remote ones are skipped,
+   partial downloads are resumed (see download) and failed transfers are retried
+   RETRIES times, BACKOFF seconds apart and doubling, on a new connection.
+
+   With a manifest, the files returned are the ones that are new or listed with another
+   size or modification time than in the manifest, whether they are downloaded now or were
+   downloaded by an earlier sync. sync_files does not write them to the manifest: once they
+   have been used (e.g. decoded), record them with record_manifest, so that they are returned
+   again if anything fails before that. If there is no manifest yet, it starts from the
+   local files that are up to date.
+
+   Args:
+      path (str): remote directory.
+      download_dir (str): path to directory to save these files locally.
+      select (function): takes a filename, returns True if it should be synced. Default syncs all files.
+      workers (int): number of concurrent connections, FTP_WORKERS in utils/constants.py of each project.
+      host (str), port (int): FTP server, default HOST and PORT, e.g. a local server for testing.
+      manifest (str): path of the manifest (json), None to compare with the local files only.
+
+   Returns:
+      dict {filename: (size, modified)} of the files downloaded, or with a manifest, of the files not recorded in it yet.
+   '''
+
+   ftp = connect(path, host, port)
+   remote = remote_files(ftp)
+   ftp.quit()
+
+   names = [name for name in sorted(remote) if select is None or select(name)]
+   if manifest is None:
+      todo = [name for name in names if not up_to_date(download_dir+name, *remote[name])]
+   else:
+      if not os.path.exists(manifest): #first sync with a manifest, files already downloaded and unchanged are not new
+         write_manifest(manifest, {name: remote[name] for name in names if up_to_date(download_dir+name, *remote[name])})
+      recorded = read_manifest(manifest)
+      pending = {name: remote[name] for name in names if recorded.get(name) != remote[name]}
+      #pending files downloaded by an earlier sync are returned again, but not downloaded again
+      todo = [name for name in names if not os.path.exists(download_dir+name)
+              or (name in pending and not up_to_date(download_dir+name, *remote[name]))]
+   print(str(len(names)-len(todo))+' files up to date, downloading '+str(len(todo)))
+
+   local = threading.local() #each worker thread keeps its own connection
+   connections = []
+
+   def fetch(name):
+      size, modified = remote[name]
+      for attempt in range(RETRIES):
+         try:
+            if getattr(local, 'ftp', None) is None:
+               local.ftp = connect(path, host, port)
+               connections.append(local.ftp)
+            download(local.ftp, download_dir, name, size, modified)
+            print('Downloaded => '+name)
+            return name
+         except ftplib.all_errors as err:
+            local.ftp = None #the connection may be broken, open a new one
+            if attempt == RETRIES - 1:
+               raise
+            print('Retrying '+name+' after error: '+repr(err))
+            time.sleep(BACKOFF * 2**attempt)
+
+   downloaded, error = {}, None
+   try:
+      with ThreadPoolExecutor(max_workers=workers) as pool:
+         futures = [pool.submit(fetch, name) for name in todo]
+         for name, future in zip(todo, futures):
+            try:
+               future.result()
+            except Exception as err: #the other files are still downloaded, the first error is raised below
+               error = error or err
+               continue
+            downloaded[name] = remote[name]
+   finally:
+      for connection in connections:
+         try:
+            connection.quit()
+         except ftplib.all_errors:
+            connection.close()
+
+   if error is not None:
+      raise error
+   return downloaded if manifest is None else pending
@@ -1,22 +1,52 @@
 ## Author: Aleksandra Elias Chereque
 ## Created: July 20, 2020
-## Last edited: Sept 2, 2020
+## Last edited: Oct 18, 2026
 
 import numpy as np
 from netCDF4 import Dataset, date2num
 import time as t
 from datetime import datetime, timedelta
+import xarray as xr
+from concurrent.futures import ProcessPoolExecutor
 
-from utils.constants import CMC_DIR, CMC_files_loc
+from utils.constants import CMC_DIR, CMC_files_loc, SETUP_WORKERS
 from utils.CMC_tools import load_latlon, read_mly_data
 
-def raw_to_nc_CMC(year):
+#one month of the grid per chunk (2 MB), matching how SD_calc reads the files
+SDP_CHUNKS = (1, 706, 706)
+
+def read_NSIDC_year(year):
+   '''
+   Returns the monthly snow depth of year (months, 706, 706) from the NSIDC zip file in CMC_DIR.
+   Only Aug-Dec are available for 1998.
+   '''
+   path = 'cmc_sdepth_mly_'+str(year)+'_v01.2.zip'
+   return read_mly_data(CMC_DIR, path, months = 5 if year == 1998 else 12)
+
+def read_ECCC_months(year, months_available):
+   '''
+   Returns the monthly snow depth of the first months_available months of year (months, 706, 706),
+   from the ECCC monthly NetCDF files in CMC_DIR (used for the current year, see README).
+   '''
+   sdp_vals = np.zeros((months_available, 706, 706), dtype=np.float32)
+   for i in range(months_available):
+      with xr.open_dataset(CMC_DIR+str(year)+'%02d'%(i+1)+'_snow_ps24km60N.nc') as data:
+         sdp_vals[i,:,:] = data.snd.values
+   return sdp_vals
+
+def write_CMC_year(year, sdp_vals, lat_vals, lon_vals):
+   '''
+   Writes one year of monthly snow depth to CMC_sdp_mly_YYYY.nc in CMC_files_loc, with the lat/lon
+   grids attached. sdp is stored compressed, one month per chunk.
+
+   Args:
+      year (int): year of the data. Months start in August for 1998, in January otherwise.
+      sdp_vals (array): monthly snow depth (months, 706, 706).
+      lat_vals, lon_vals (arrays): lat/lon grids (706, 706), see CMC_tools.load_latlon.
+   '''
    rootgrp = Dataset(CMC_files_loc+'CMC_sdp_mly_'+str(year)+'.nc', 'w', format='NETCDF4')
 
-   if year == 1998:
-      time = rootgrp.createDimension('time', 5) #only data for Aug-Dec available for 1998
-   else:
-      time = rootgrp.createDimension('time', 12)
+   time = rootgrp.createDimension('time', len(sdp_vals))
 
    xc = rootgrp.createDimension('xc', 706) #x cartesian coordinate
    yc = rootgrp.createDimension('yc', 706) #y cartesian coordinate
@@ -27,9 +57,9 @@ def raw_to_nc_CMC(year):
 
    #create variable that is not a dimension
    latlon = rootgrp.createVariable('latitude_longitude', 'i4')
-   sdp = rootgrp.createVariable('sdp', 'f4', ('time', 'yc', 'xc',))
+   sdp = rootgrp.createVariable('sdp', 'f4', ('time', 'yc', 'xc',), zlib=True, complevel=4, shuffle=True, chunksizes=SDP_CHUNKS)
 
-   #Set global and variable attributes 
+   #Set global and variable attributes
 
    rootgrp.Conventions = 'CF-1.6'
    rootgrp.description = 'Aggregated monthly NH CMC snow depth for one calendar year'
@@ -58,18 +88,15 @@ def raw_to_nc_CMC(year):
 
    #passing data to Variable instances, as one would for an array
 
-   lat_vals, lon_vals = load_latlon()
-
    lats[:] = lat_vals
    lons[:] = lon_vals
 
-   path = 'cmc_sdepth_mly_'+str(year)+'_v01.2.zip'
-   sdp[:,:,:] = read_mly_data(CMC_DIR, path, months = len(times))
-   
+   sdp[:,:,:] = sdp_vals
+
    for i in range(1, len(times)+1):
       if year == 1998:
          date = datetime(year, i+7, 1) #only last 5 months of 1998 are available
-      else: 
+      else:
          date = datetime(year, i, 1)
 
       #date2num converts datetime objects to numeric values of time in the specified units and calendar
@@ -77,3 +104,45 @@ def raw_to_nc_CMC(year):
 
    rootgrp.close()
    print('done year: '+str(year))
+
+def raw_to_nc_CMC(year, latlon=None):
+   '''
+   Groups one year of NSIDC monthly snow depth into a NetCDF file in CMC_files_loc.
+
+   Args:
+      year (int): year of interest.
+      latlon (tuple): lat/lon grids, loaded with CMC_tools.load_latlon if None.
+   '''
+   lat_vals, lon_vals = load_latlon() if latlon is None else latlon
+   write_CMC_year(year, read_NSIDC_year(year), lat_vals, lon_vals)
+
+def init_writer(lat_vals, lon_vals):
+   '''
+   Keeps the lat/lon grids in each worker process of raw_to_nc_CMC_years, so they are sent once per worker.
+   '''
+   global writer_latlon
+   writer_latlon = (lat_vals, lon_vals)
+
+def build_year(year):
+   write_CMC_year(year, read_NSIDC_year(year), *writer_latlon)
+   return year
+
+def raw_to_nc_CMC_years(years, workers=SETUP_WORKERS):
+   '''
+   Groups several years of NSIDC monthly snow depth into NetCDF files in CMC_files_loc, building years
+   in parallel. The lat/lon grids are loaded once and shared with the workers. current_y is not built,
+   it is read from the ECCC monthly files when the data is loaded (see CMC_view.open_year).
+
+   Args:
+      years (list of int): years to build from the NSIDC zip files.
+      workers (int): number of worker processes, see SETUP_WORKERS in utils/constants.py. With 1, years are built in turn.
+   '''
+   lat_vals, lon_vals = load_latlon()
+
+   if workers == 1:
+      init_writer(lat_vals, lon_vals)
+      for year in years:
+         build_year(year)
+   else:
+      with ProcessPoolExecutor(max_workers=workers, initializer=init_writer, initargs=(lat_vals, lon_vals)) as pool:
+         list(pool.map(build_year, years)) #each worker reports its years, errors are raised here